@@ -0,0 +1,91 @@
+"""Benchmark HTML extraction backends on saved pages: pages/sec, peak memory, parity with html.parser.
+
+Each backend runs in a fresh process so peak RSS (which includes libxml2's C
+allocations) is measured per backend, relative to the process after imports
+and fixture loading.
+
+  python scripts/bench_html_extract.py --html_dir data/html_fixtures --repeat 20
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import resource
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.ingest.scrape_sources import PARSERS, extract_text  # noqa: E402
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    scale = 1 / 1024 if sys.platform != "darwin" else 1 / 1024**2
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def read_page(path: str) -> str:
+    # keep CRLF line endings as a scraped response would (read_text would translate them)
+    return Path(path).read_bytes().decode("utf-8")
+
+
+def run_backend(job) -> dict:
+    parser, paths, repeat = job
+    pages = [read_page(p) for p in paths]
+    try:
+        extract_text("<p></p>", parser)  # imports the backend before the memory baseline
+    except ImportError as exc:
+        return {"parser": parser, "error": str(exc)}
+    base = peak_rss_mb()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        texts = [extract_text(html, parser) for html in pages]
+    seconds = time.perf_counter() - start
+    return {
+        "parser": parser,
+        "pages_per_sec": repeat * len(pages) / seconds,
+        "mb_per_sec": repeat * sum(len(h.encode("utf-8")) for h in pages) / seconds / 1e6,
+        "peak_rss_delta_mb": peak_rss_mb() - base,
+        "texts": texts,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--html_dir", default="data/html_fixtures", help="Directory of saved *.html pages")
+    ap.add_argument("--repeat", type=int, default=20, help="Passes over the fixtures per backend")
+    ap.add_argument("--parsers", nargs="+", default=sorted(PARSERS), choices=sorted(PARSERS))
+    ap.add_argument("--out", default=None, help="Optional JSON report path")
+    args = ap.parse_args()
+
+    paths = sorted(str(p) for p in Path(args.html_dir).glob("*.html"))
+    if not paths:
+        raise ValueError(f"No *.html files in {args.html_dir}")
+
+    ctx = mp.get_context("spawn")
+    results = []
+    for parser in args.parsers:
+        with ctx.Pool(1) as pool:
+            results.append(pool.apply(run_backend, ((parser, paths, args.repeat),)))
+
+    reference = [extract_text(read_page(p)) for p in paths]
+    print(f"{len(paths)} pages x {args.repeat} passes from {args.html_dir}")
+    print(f"{'parser':<12} {'pages/s':>9} {'MB/s':>7} {'peak RSS +MB':>13} {'match':>7}")
+    for res in results:
+        if "error" in res:
+            print(f"{res['parser']:<12} not available: {res['error']}")
+            continue
+        res["matching_pages"] = sum(a == b for a, b in zip(res.pop("texts"), reference))
+        print(
+            f"{res['parser']:<12} {res['pages_per_sec']:>9.1f} {res['mb_per_sec']:>7.2f} "
+            f"{res['peak_rss_delta_mb']:>13.1f} {res['matching_pages']:>3}/{len(paths)}"
+        )
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@
 
 import subprocess
 import sys
+import tempfile
+from pathlib import Path
 
 
 def run(cmd: list[str]) -> None:
@@ -52,6 +54,51 @@ def main() -> None:
             "outputs/tfidf_preds.jsonl",
         ]
     )
+    # regression: one record per chunk, so chunks of empty-text records have no sentences
+    with tempfile.TemporaryDirectory() as tmp:
+        model = str(Path(tmp) / "tfidf.joblib")
+        run(
+            [
+                sys.executable,
+                "-m",
+                "src.baselines.tfidf_baseline",
+                "--data",
+                "data/processed/incidents.jsonl",
+                "--split",
+                "outputs/split.json",
+                "--save-model",
+                model,
+            ]
+        )
+        streaming = str(Path(tmp) / "tfidf_online.joblib")
+        run(
+            [
+                sys.executable,
+                "-m",
+                "src.baselines.tfidf_online",
+                "--train",
+                "data/processed/incidents.jsonl",
+                "--save-model",
+                streaming,
+            ]
+        )
+        # batch and streaming (hashing vectorizer) artifacts
+        for artifact in (model, streaming):
+            run(
+                [
+                    sys.executable,
+                    "-m",
+                    "src.baselines.tfidf_baseline",
+                    "--model",
+                    artifact,
+                    "--test",
+                    "data/processed/incidents.jsonl",
+                    "--chunk-size",
+                    "1",
+                    "--out",
+                    str(Path(tmp) / "tfidf_chunk1.jsonl"),
+                ]
+            )
     run(
         [
             sys.executable,
@@ -0,0 +1,67 @@
+"""Score with frozen-encoder heads twice: the second, fully cached run must never call the encoder.
+
+Builds a tiny random BERT (vocabulary from the corpus) in a temp dir, so it runs offline.
+"""
+
+import json
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import torch
+import yaml
+from torch import nn
+from transformers import BertConfig, BertModel, BertTokenizerFast
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.models.frozen import FrozenHeadClassifier  # noqa: E402
+
+
+def tiny_encoder(path: Path, texts: list[str]) -> None:
+    words = sorted({w for t in texts for w in re.findall(r"\w+|[^\w\s]", t.lower())})
+    (path / "vocab.txt").write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", *words]), encoding="utf-8")
+    BertTokenizerFast(vocab_file=str(path / "vocab.txt")).save_pretrained(str(path))
+    torch.manual_seed(0)
+    config = BertConfig(
+        vocab_size=len(words) + 5, hidden_size=32, num_hidden_layers=2, num_attention_heads=2, intermediate_size=64
+    )
+    BertModel(config).save_pretrained(str(path))
+
+
+def main() -> None:
+    records = [json.loads(l) for l in Path("data/processed/incidents.jsonl").read_text(encoding="utf-8").splitlines()]
+    texts = [r.get("text", "") for r in records] + ["", "One sentence without a full stop"]
+    labels = yaml.safe_load(Path("data/schema.yaml").read_text(encoding="utf-8"))["labels"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        (tmp / "encoder").mkdir()
+        tiny_encoder(tmp / "encoder", texts)
+        model = FrozenHeadClassifier(str(tmp / "encoder"), labels, max_length=32, cache_dir=str(tmp / "emb"))
+        torch.manual_seed(0)
+        model.heads = nn.ModuleDict({field: nn.Linear(32, len(labs)) for field, labs in labels.items()})
+        cold_probs, cold_evidence = model.score(texts)
+        cold = model.cache()
+        assert cold.misses == len(set(texts)) and cold.hits == len(texts) - len(set(texts)), (cold.hits, cold.misses)
+        model.save(tmp / "heads")
+
+        warm_model = FrozenHeadClassifier.load(tmp / "heads")
+
+        def no_encoder(*args, **kwargs):
+            raise AssertionError("the encoder ran on a fully cached corpus")
+
+        warm_model.encoder.encode = no_encoder
+        warm_probs, warm_evidence = warm_model.score(texts)
+        warm = warm_model.cache()
+        assert warm.hits == len(texts) and warm.misses == 0, (warm.hits, warm.misses)
+        assert np.array_equal(cold_probs, warm_probs)
+        for a, b in zip(cold_evidence, warm_evidence):
+            assert all(a.top(j) == b.top(j) for j in range(model.num_labels))
+    print(f"OK: {len(texts)} texts, cold run encoded {cold.misses}, warm run {warm.hits} hits and no encoder call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Run the batch scraper twice against a local HTTP server: the second run must be all 304s.
+
+Further runs check --min_interval (request spacing with --per_host 1) and
+--per_host (requests in flight against a slow server). With lxml installed, switching
+--parser must refetch instead of serving html.parser text on a 304.
+Runs with a failed URL (batch or a single --url) must exit non-zero.
+"""
+
+import csv
+import hashlib
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+PAGES = {
+    f"/report-{i}": f"<html><body><script>x()</script><p>Flight {i} report.</p><p>Booster engine shutdown {i}.</p></body></html>"
+    for i in range(6)
+}
+STATUSES = Counter()
+STARTS = []  # monotonic time each request arrived
+MIN_INTERVAL = 0.2
+SLOW = {"delay": 0.0, "in_flight": 0, "peak": 0}
+SLOW_LOCK = threading.Lock()
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        STARTS.append(time.monotonic())
+        with SLOW_LOCK:
+            SLOW["in_flight"] += 1
+            SLOW["peak"] = max(SLOW["peak"], SLOW["in_flight"])
+        time.sleep(SLOW["delay"])
+        with SLOW_LOCK:
+            SLOW["in_flight"] -= 1
+        body = PAGES.get(self.path)
+        if body is None:
+            STATUSES[404] += 1
+            self.send_error(404)
+            return
+        etag = '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:16] + '"'
+        if self.headers.get("If-None-Match") == etag:
+            STATUSES[304] += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        STATUSES[200] += 1
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def run(cmd: list[str], check: bool = True) -> int:
+    print("$", " ".join(cmd))
+    return subprocess.run(cmd, check=check).returncode
+
+
+def main() -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        sources = tmp / "sources.csv"
+        with sources.open("w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["incident_id", "incident_name", "url", "retrieved_date", "notes"])
+            for i, path in enumerate(PAGES):
+                writer.writerow([f"local-{i}", f"Local {i}", base + path, "", ""])
+            writer.writerow(["local-missing", "Missing", base + "/missing", "", ""])
+            writer.writerow(["no-url", "No url", "", "", ""])
+
+        out = tmp / "scraped.jsonl"
+        cmd = [
+            sys.executable,
+            "-m",
+            "src.ingest.scrape_sources",
+            "--sources",
+            str(sources),
+            "--out",
+            str(out),
+            "--cache",
+            str(tmp / "http_cache.json"),
+            "--min_interval",
+            "0",
+        ]
+        # /missing fails, so each run exits non-zero after writing the rest
+        assert run(cmd, check=False) == 1
+        first = dict(STATUSES)
+        assert run(cmd, check=False) == 1
+        second = {k: v - first.get(k, 0) for k, v in STATUSES.items()}
+
+        records = [json.loads(l) for l in out.read_text(encoding="utf-8").splitlines() if l.strip()]
+        assert len(records) == len(PAGES), f"expected {len(PAGES)} records, got {len(records)}"
+        assert all("Booster engine shutdown" in r["text"] and "x()" not in r["text"] for r in records)
+        assert second.get(200, 0) == 0 and second.get(304) == len(PAGES), f"second run statuses: {second}"
+
+        # all URLs share one host: one request in flight, starts MIN_INTERVAL apart
+        STARTS.clear()
+        run(cmd[:-1] + [str(MIN_INTERVAL), "--per_host", "1", "--cache", ""], check=False)
+        gaps = [b - a for a, b in zip(STARTS, STARTS[1:])]
+        assert len(STARTS) == len(PAGES) + 1, f"expected {len(PAGES) + 1} requests, got {len(STARTS)}"
+        assert min(gaps) >= MIN_INTERVAL * 0.9, f"requests to one host {min(gaps):.3f}s apart, expected {MIN_INTERVAL}s"
+
+        # slow responses and no interval: --per_host caps requests in flight
+        SLOW["delay"] = 0.1
+        run(cmd + ["--per_host", "2", "--cache", ""], check=False)
+        SLOW["delay"] = 0.0
+        assert SLOW["peak"] == 2, f"expected 2 requests in flight with --per_host 2, saw {SLOW['peak']}"
+
+        # a cache entry extracted with another parser must not be served on a 304
+        try:
+            import lxml  # noqa: F401
+        except ImportError:
+            print("lxml not installed; skipping the --parser cache check")
+        else:
+            before = dict(STATUSES)
+            run(cmd + ["--parser", "lxml"], check=False)
+            third = {k: v - before.get(k, 0) for k, v in STATUSES.items()}
+            assert third.get(200) == len(PAGES) and third.get(304, 0) == 0, f"--parser lxml run statuses: {third}"
+            assert run(cmd + ["--parser", "lxml"], check=False) == 1
+            assert STATUSES[304] - before.get(304, 0) == len(PAGES), "lxml entries should revalidate with a 304"
+
+        single = [sys.executable, "-m", "src.ingest.scrape_sources", "--url", base + "/missing", "--incident_id", "x"]
+        code = run(single + ["--out", str(tmp / "single.jsonl"), "--cache", ""], check=False)
+        assert code != 0, "a failed --url fetch must exit non-zero"
+    server.shutdown()
+    print(f"OK: first run {first}, second run {second}, min gap {min(gaps):.3f}s, peak in flight {SLOW['peak']}, failed --url exit code {code}")
+
+
+if __name__ == "__main__":
+    main()
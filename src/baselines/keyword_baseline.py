@@ -5,18 +5,23 @@ Simple rules/keywords multi-label baseline.
 
 It:
 - loads schema.yaml label space
-- maps keywords -> labels
+- maps keywords -> labels (compiled once into an Aho–Corasick automaton)
 - emits predictions + evidence sentences
+- streams the input JSONL in chunks, optionally across a process pool (--workers)
 
 This is intentionally transparent for error analysis.
 """
 
 import argparse
 import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
 import yaml
+from src.baselines.keyword_matcher import KeywordMatcher
 from src.utils import split_sentences
 
 
@@ -69,31 +74,37 @@ KEYWORDS = {
 }
 
 
+FIELDS = ["subsystem", "failure_mode", "impact", "cause"]
+
+MATCHER = KeywordMatcher(KEYWORDS)
+
+
+@lru_cache(maxsize=32)
+def _compile_field(items: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> KeywordMatcher:
+    return KeywordMatcher({"_": {label: list(kws) for label, kws in items}})
+
+
 def score_labels(
     text: str, field_map: Dict[str, List[str]]
 ) -> Tuple[List[str], Dict[str, float], Dict[str, List[int]]]:
     """Return labels, confidences, and evidence sentence indices."""
-    text_l = text.lower()
-    sents = split_sentences(text)
-    picked = []
-    conf = {}
-    evidence = {}
-
-    for label, kws in field_map.items():
-        hits = 0
-        evid = []
-        for kw in kws:
-            if kw.lower() in text_l:
-                hits += 1
-                # evidence: sentences containing keyword
-                for idx, s in enumerate(sents):
-                    if kw.lower() in s.lower():
-                        evid.append(idx)
-        if hits > 0:
-            picked.append(label)
-            conf[label] = min(0.95, 0.3 + 0.2 * hits)
-            evidence[label] = list(dict.fromkeys(evid))[:3]
-    return picked, conf, evidence
+    for field, known in KEYWORDS.items():
+        if field_map is known:
+            return MATCHER.scan(text, [field])[field]
+    key = tuple((label, tuple(kws)) for label, kws in field_map.items())
+    return _compile_field(key).scan(text)["_"]
+
+
+def score_fields(
+    text: str, fields: List[str] = FIELDS
+) -> Dict[str, Tuple[List[str], Dict[str, float], Dict[str, List[int]]]]:
+    """Score all fields against KEYWORDS with a single scan of the text."""
+    return MATCHER.scan(text, fields)
+
+
+def score_batch(texts: List[str], fields: List[str] = FIELDS) -> dict:
+    """Corpus-level keyword hits as sparse matrices (see KeywordMatcher.score_batch)."""
+    return MATCHER.score_batch(texts, fields)
 
 
 def load_jsonl(path: Path) -> List[dict]:
@@ -104,12 +115,93 @@ def load_split(path: Path) -> dict:
     return json.loads(path.read_text(encoding="utf-8"))
 
 
+def iter_line_chunks(path: Path, chunk_size: int) -> Iterator[List[str]]:
+    """Lazily yield non-blank JSONL lines in chunks of at most chunk_size."""
+    chunk = []
+    with path.open("r", encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def predict_record(rec: dict, label_space: Dict[str, List[str]]) -> dict:
+    pred = {"incident_id": rec["incident_id"], "pred": {}, "confidence": {}, "evidence": {}}
+    for field, (labels, conf, evid) in score_fields(rec["text"]).items():
+        # keep only labels in schema
+        labels = [x for x in labels if x in label_space[field]]
+        pred["pred"][field] = labels
+        pred["confidence"][field] = conf
+        pred["evidence"][field] = evid
+    return pred
+
+
+# per-process state for stream workers (set once by the pool initializer)
+_STREAM_STATE: dict = {}
+
+
+def _init_stream(label_space: Dict[str, List[str]], test_ids: Optional[Set[str]]) -> None:
+    _STREAM_STATE["label_space"] = label_space
+    _STREAM_STATE["test_ids"] = test_ids
+
+
+def _score_chunk(lines: List[str]) -> List[str]:
+    label_space = _STREAM_STATE["label_space"]
+    test_ids = _STREAM_STATE["test_ids"]
+    out = []
+    for line in lines:
+        rec = json.loads(line)
+        if test_ids is not None and rec.get("incident_id") not in test_ids:
+            continue
+        out.append(json.dumps(predict_record(rec, label_space), ensure_ascii=False))
+    return out
+
+
+def stream_predictions(
+    path: Path,
+    label_space: Dict[str, List[str]],
+    test_ids: Optional[Set[str]] = None,
+    workers: int = 1,
+    chunk_size: int = 256,
+) -> Iterator[str]:
+    """Yield prediction JSON lines in input order.
+
+    With workers > 1, chunks are scored in a process pool. At most
+    2 * workers chunks are in flight, so memory stays bounded by
+    chunk_size rather than by file size.
+    """
+    chunks = iter_line_chunks(path, chunk_size)
+    if workers <= 1:
+        _init_stream(label_space, test_ids)
+        for chunk in chunks:
+            yield from _score_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_stream, initargs=(label_space, test_ids)
+    ) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_score_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--data", required=True)
     ap.add_argument("--schema", default="data/schema.yaml")
     ap.add_argument("--out", required=True)
     ap.add_argument("--split", default=None, help="Optional split.json to filter to test IDs")
+    ap.add_argument("--workers", type=int, default=1, help="Scoring processes (1 = in-process)")
+    ap.add_argument("--chunk-size", type=int, default=256, help="Records per worker task")
     args = ap.parse_args()
 
     schema = yaml.safe_load(Path(args.schema).read_text(encoding="utf-8"))
@@ -118,23 +210,16 @@ def main():
     out_path = Path(args.out)
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
-    records = load_jsonl(Path(args.data))
+    test_ids = None
     if args.split:
         split = load_split(Path(args.split))
         test_ids = set(split.get("test", []))
-        records = [r for r in records if r.get("incident_id") in test_ids]
 
     with out_path.open("w", encoding="utf-8") as f:
-        for rec in records:
-            pred = {"incident_id": rec["incident_id"], "pred": {}, "confidence": {}, "evidence": {}}
-            for field in ["subsystem", "failure_mode", "impact", "cause"]:
-                labels, conf, evid = score_labels(rec["text"], KEYWORDS.get(field, {}))
-                # keep only labels in schema
-                labels = [x for x in labels if x in label_space[field]]
-                pred["pred"][field] = labels
-                pred["confidence"][field] = conf
-                pred["evidence"][field] = evid
-            f.write(json.dumps(pred, ensure_ascii=False) + "\n")
+        for line in stream_predictions(
+            Path(args.data), label_space, test_ids, workers=args.workers, chunk_size=args.chunk_size
+        ):
+            f.write(line + "\n")
 
     print(f"Wrote keyword predictions to {out_path}")
 
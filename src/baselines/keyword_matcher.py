@@ -0,0 +1,230 @@
+"""
+keyword_matcher.py
+------------------
+Aho–Corasick automaton over the keyword baseline tables.
+
+Every keyword of every field is compiled once into a single DFA over the
+lowercased pattern alphabet. A document is then scanned once for all fields,
+instead of running one substring search per (field, label, keyword) pair.
+
+Evidence comes from the same scan: each match offset is mapped to its
+sentence by binary search over `split_sentence_spans` offsets, so lookup
+costs O(hits log sentences) rather than a rescan of every sentence.
+
+The matcher reproduces `score_labels` exactly (plain, case-insensitive
+substring semantics, overlapping matches included). `score_batch` exposes
+the same hits for a whole corpus as SciPy sparse matrices.
+"""
+
+from bisect import bisect_right
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from src.utils import split_sentence_spans, split_sentences
+
+
+class KeywordMatcher:
+    """Compiled multi-pattern matcher for a {field: {label: [keywords]}} table."""
+
+    def __init__(self, keywords: Dict[str, Dict[str, List[str]]]):
+        self.keywords = keywords
+        self.patterns: List[str] = []
+        pattern_ids: Dict[str, int] = {}
+        # (field, label) -> keyword pattern ids, in table order (duplicates kept)
+        self.label_patterns: Dict[str, Dict[str, List[int]]] = {}
+        for field, field_map in keywords.items():
+            self.label_patterns[field] = {}
+            for label, kws in field_map.items():
+                ids = []
+                for kw in kws:
+                    kw_l = kw.lower()
+                    if kw_l not in pattern_ids:
+                        pattern_ids[kw_l] = len(self.patterns)
+                        self.patterns.append(kw_l)
+                    ids.append(pattern_ids[kw_l])
+                self.label_patterns[field][label] = ids
+        self._lengths = [len(p) for p in self.patterns]
+        self._label_matrices: Dict[str, sparse.csr_matrix] = {}
+        self._build()
+
+    def _build(self) -> None:
+        goto: List[Dict[str, int]] = [{}]
+        out: List[List[int]] = [[]]
+        for pid, pat in enumerate(self.patterns):
+            state = 0
+            for ch in pat:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].append(pid)
+
+        # BFS to resolve failure links into a full DFA: every state gets a direct
+        # transition for every alphabet character, so scanning never backtracks.
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict() for _ in goto]
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            out[state] = out[state] + out[fail[state]]
+            delta[state] = dict(delta[fail[state]])
+            for ch, nxt in goto[state].items():
+                fail[nxt] = delta[fail[state]].get(ch, 0)
+                delta[state][ch] = nxt
+                queue.append(nxt)
+
+        self._delta = delta
+        self._out: List[Tuple[int, ...]] = [tuple(o) for o in out]
+
+    def iter_matches(self, text_l: str) -> Iterator[Tuple[int, int]]:
+        """Yield (end_offset, pattern_id) for every match in already-lowercased text."""
+        delta = self._delta
+        out = self._out
+        state = 0
+        for i, ch in enumerate(text_l):
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                for pid in out[state]:
+                    yield i + 1, pid
+
+    def matched_patterns(self, text_l: str) -> Set[int]:
+        """Return the ids of all patterns occurring in already-lowercased text."""
+        delta = self._delta
+        out = self._out
+        found: Set[int] = set()
+        state = 0
+        for ch in text_l:
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+    def locate(self, text: str) -> Tuple[Set[int], Dict[int, List[int]]]:
+        """Return matched pattern ids and, per pattern, the sentence indices containing it.
+
+        A match only counts as evidence for a sentence when it lies entirely
+        inside that sentence's span, mirroring `kw in sentence.lower()`.
+        """
+        text_l = text.lower()
+        pattern_sents: Dict[int, List[int]] = {}
+        if len(text_l) != len(text):
+            # lowercasing changed offsets (e.g. "İ"); fall back to per-sentence scans
+            for idx, s in enumerate(split_sentences(text)):
+                for pid in self.matched_patterns(s.lower()):
+                    pattern_sents.setdefault(pid, []).append(idx)
+            return self.matched_patterns(text_l), pattern_sents
+
+        spans = split_sentence_spans(text)
+        starts = [a for a, _ in spans]
+        lengths = self._lengths
+        doc_hits: Set[int] = set()
+        for end, pid in self.iter_matches(text_l):
+            doc_hits.add(pid)
+            idx = bisect_right(starts, end - lengths[pid]) - 1
+            if idx < 0 or end > spans[idx][1]:
+                continue
+            sents = pattern_sents.setdefault(pid, [])
+            if not sents or sents[-1] != idx:
+                sents.append(idx)
+        return doc_hits, pattern_sents
+
+    def scan(
+        self, text: str, fields: Optional[Sequence[str]] = None
+    ) -> Dict[str, Tuple[List[str], Dict[str, float], Dict[str, List[int]]]]:
+        """Score every requested field; returns {field: (labels, conf, evidence)}."""
+        fields = list(self.keywords) if fields is None else fields
+        doc_hits, pattern_sents = self.locate(text)
+
+        results = {}
+        for field in fields:
+            picked = []
+            conf = {}
+            evidence = {}
+            for label, pids in self.label_patterns.get(field, {}).items():
+                hits = 0
+                evid = []
+                for pid in pids:
+                    if pid in doc_hits:
+                        hits += 1
+                        evid.extend(pattern_sents.get(pid, []))
+                if hits > 0:
+                    picked.append(label)
+                    conf[label] = min(0.95, 0.3 + 0.2 * hits)
+                    evidence[label] = list(dict.fromkeys(evid))[:3]
+            results[field] = (picked, conf, evidence)
+        return results
+
+    def label_matrix(self, field: str) -> sparse.csr_matrix:
+        """(n_patterns x n_labels) keyword counts per label, duplicates included."""
+        if field not in self._label_matrices:
+            rows, cols = [], []
+            for j, pids in enumerate(self.label_patterns.get(field, {}).values()):
+                rows.extend(pids)
+                cols.extend([j] * len(pids))
+            shape = (len(self.patterns), len(self.label_patterns.get(field, {})))
+            data = np.ones(len(rows), dtype=np.int32)
+            # coo -> csr sums duplicate (pattern, label) entries
+            self._label_matrices[field] = sparse.coo_matrix((data, (rows, cols)), shape=shape).tocsr()
+        return self._label_matrices[field]
+
+    def score_batch(self, texts: Sequence[str], fields: Optional[Sequence[str]] = None) -> dict:
+        """Score a corpus at once.
+
+        Returns:
+          labels:   {field: [label names]} (matrix column order)
+          hits:     {field: csr (n_docs x n_labels)} matched keyword counts;
+                    nonzero entries are exactly `scan(...)` labels, and the value is
+                    the hit count behind its confidence
+          evidence: {field: csr (n_docs x max_sentences)} number of the field's
+                    labels supported by each sentence (all sentences, no top-3 cut)
+        """
+        fields = list(self.keywords) if fields is None else fields
+        doc_rows: List[int] = []
+        doc_cols: List[int] = []
+        ev_docs: List[int] = []
+        ev_sents: List[int] = []
+        ev_pids: List[int] = []
+        for i, text in enumerate(texts):
+            doc_hits, pattern_sents = self.locate(text)
+            doc_rows.extend([i] * len(doc_hits))
+            doc_cols.extend(doc_hits)
+            for pid, sent_ids in pattern_sents.items():
+                ev_docs.extend([i] * len(sent_ids))
+                ev_sents.extend(sent_ids)
+                ev_pids.extend([pid] * len(sent_ids))
+
+        n_docs = len(texts)
+        n_patterns = len(self.patterns)
+        doc_patterns = sparse.csr_matrix(
+            (np.ones(len(doc_rows), dtype=np.int32), (doc_rows, doc_cols)), shape=(n_docs, n_patterns)
+        )
+
+        # one row per (doc, sentence) pair that holds at least one keyword
+        ev_docs_a = np.asarray(ev_docs, dtype=np.int64)
+        ev_sents_a = np.asarray(ev_sents, dtype=np.int64)
+        width = int(ev_sents_a.max()) + 1 if ev_sents_a.size else 0
+        pair_keys, pair_rows = np.unique(ev_docs_a * max(width, 1) + ev_sents_a, return_inverse=True)
+        sent_patterns = sparse.csr_matrix(
+            (np.ones(len(ev_pids), dtype=np.int32), (pair_rows, ev_pids)),
+            shape=(len(pair_keys), n_patterns),
+        )
+        pair_docs = pair_keys // max(width, 1)
+        pair_sents = pair_keys % max(width, 1)
+
+        out = {"labels": {}, "hits": {}, "evidence": {}}
+        for field in fields:
+            P = self.label_matrix(field)
+            out["labels"][field] = list(self.label_patterns.get(field, {}))
+            out["hits"][field] = (doc_patterns @ P).tocsr()
+            cited = np.asarray(((sent_patterns @ P) > 0).sum(axis=1), dtype=np.int32).ravel()
+            evidence = sparse.csr_matrix((cited, (pair_docs, pair_sents)), shape=(n_docs, width))
+            evidence.eliminate_zeros()
+            out["evidence"][field] = evidence
+        return out
@@ -0,0 +1,68 @@
+"""
+online_models.py
+----------------
+Incrementally trainable vectorizer/classifier used by tfidf_online.py.
+
+Kept in their own module so pickled artifacts reference a stable import path
+(not `__main__`) and load from `tfidf_baseline --model`.
+"""
+
+from typing import List
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import normalize
+
+
+class StreamingTfidfVectorizer:
+    """HashingVectorizer + smoothed IDF whose document frequencies grow with partial_fit."""
+
+    def __init__(self, n_features: int = 2**18, max_df: float = 0.95):
+        self.n_features = n_features
+        self.max_df = max_df
+        self.hasher = HashingVectorizer(
+            ngram_range=(1, 2), n_features=n_features, alternate_sign=False, norm=None
+        )
+        self.df = np.zeros(n_features, dtype=np.int64)
+        self.n_docs = 0
+        self.idf_ = np.ones(n_features, dtype=np.float64)
+
+    def partial_fit(self, texts: List[str]) -> "StreamingTfidfVectorizer":
+        counts = self.hasher.transform(texts)
+        counts.sum_duplicates()
+        self.df += np.bincount(counts.indices, minlength=self.n_features)
+        self.n_docs += counts.shape[0]
+        return self
+
+    def finalize(self) -> None:
+        """Recompute idf_ from the accumulated counts (same formula as TfidfVectorizer)."""
+        n = self.n_docs
+        self.idf_ = np.log((1 + n) / (1 + self.df)) + 1.0
+        # emulate max_df by zeroing features that occur in too many documents
+        if n:
+            self.idf_[self.df > self.max_df * n] = 0.0
+
+    def transform(self, texts: List[str]) -> sparse.csr_matrix:
+        X = self.hasher.transform(texts) @ sparse.diags(self.idf_)
+        return normalize(sparse.csr_matrix(X))
+
+
+class IncrementalOneVsRest:
+    """One SGD logistic-regression classifier per label, trained with partial_fit."""
+
+    def __init__(self, n_labels: int, alpha: float = 1e-4, random_state: int = 0):
+        self.estimators_ = [
+            SGDClassifier(loss="log_loss", alpha=alpha, random_state=random_state) for _ in range(n_labels)
+        ]
+
+    def partial_fit(self, X, Y: np.ndarray) -> "IncrementalOneVsRest":
+        for j, est in enumerate(self.estimators_):
+            est.partial_fit(X, Y[:, j], classes=np.array([0, 1]))
+        return self
+
+    def predict_proba(self, X) -> np.ndarray:
+        if not self.estimators_:
+            return np.zeros((X.shape[0], 0))
+        return np.column_stack([est.predict_proba(X)[:, 1] for est in self.estimators_])
@@ -3,38 +3,78 @@ tfidf_baseline.py
 -----------------
 TF–IDF + One-vs-Rest Logistic Regression multi-label baseline.
 
-Trains one classifier per field (subsystem, failure_mode, impact, cause).
-Emits predictions + probabilities + simple evidence (top tfidf tokens, not spans).
+Fits one corpus-level TF–IDF vectorizer and trains one classifier per field
+(subsystem, failure_mode, impact, cause) on the shared feature matrix. The
+per-label logistic regressions of all fields train in one worker pool (--n-jobs).
+Emits predictions + probabilities + per-label evidence sentences (ranked by each
+label's logistic-regression weights over the sentence's TF–IDF vector).
+
+Fitted models can be saved (--save-model) and reloaded for prediction only (--model):
+
+  python -m src.baselines.tfidf_baseline --train train.jsonl --save-model outputs/tfidf_model.joblib
+  python -m src.baselines.tfidf_baseline --model outputs/tfidf_model.joblib --test new.jsonl --out preds.jsonl
 
 This baseline is strong enough to beat keywords on small datasets and is a standard NLP reference point.
 """
 
 import argparse
 import json
+import time
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional
 
+import joblib
 import numpy as np
+import sklearn
 import yaml
+from joblib import Parallel, delayed
+from scipy import sparse
+from sklearn.base import clone
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 from sklearn.multiclass import OneVsRestClassifier
-from sklearn.preprocessing import MultiLabelBinarizer
+from sklearn.preprocessing import LabelBinarizer, MultiLabelBinarizer
+from threadpoolctl import threadpool_limits
 
+from src import __version__
 from src.utils import split_sentences
 
 
+FIELDS = ["subsystem", "failure_mode", "impact", "cause"]
+
+# bump when the saved artifact layout changes
+ARTIFACT_VERSION = 1
+
+BASE_ESTIMATOR = LogisticRegression(max_iter=2000)
+
+
 def load_jsonl(path: str) -> List[Dict]:
     return [json.loads(l) for l in Path(path).read_text(encoding="utf-8").splitlines() if l.strip()]
 
 
+def iter_jsonl(path: str) -> Iterator[Dict]:
+    with Path(path).open("r", encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip():
+                yield json.loads(line)
+
+
 def load_split(path: Optional[str]) -> Optional[dict]:
     if not path:
         return None
     return json.loads(Path(path).read_text(encoding="utf-8"))
 
 
-def fit_field(texts: List[str], y: List[List[str]], all_labels: List[str]):
+def fit_vectorizer(texts: List[str]):
+    """Fit the TF–IDF vectorizer shared by all fields; returns (vec, X)."""
+    vec = TfidfVectorizer(ngram_range=(1, 2), min_df=1, max_df=0.95)
+    X = vec.fit_transform(texts)
+    return vec, X
+
+
+def prepare_field(y: List[List[str]], all_labels: List[str]):
+    """Binarize one field's labels; returns (mlb, active_labels, always_on, Y)."""
     label_counts = {label: 0 for label in all_labels}
     for row in y:
         for label in row:
@@ -48,25 +88,74 @@ def fit_field(texts: List[str], y: List[List[str]], all_labels: List[str]):
     mlb = MultiLabelBinarizer(classes=active_labels)
     y_active = [[label for label in row if label in active_labels] for row in y]
     Y = mlb.fit_transform(y_active)
+    return mlb, active_labels, always_on, Y
+
+
+def fit_label(X, y_col: np.ndarray, blas_threads: Optional[int] = None):
+    """Fit one binary classifier under a BLAS thread cap; returns (estimator, seconds)."""
+    start = time.perf_counter()
+    with threadpool_limits(limits=blas_threads):
+        est = clone(BASE_ESTIMATOR).fit(X, y_col)
+    return est, time.perf_counter() - start
+
+
+def assemble_ovr(estimators: list, Y: np.ndarray) -> OneVsRestClassifier:
+    """Wrap per-label estimators fitted outside OneVsRestClassifier.fit (mirrors its fitted state)."""
+    clf = OneVsRestClassifier(clone(BASE_ESTIMATOR))
+    clf.label_binarizer_ = LabelBinarizer(sparse_output=True).fit(Y)
+    clf.classes_ = clf.label_binarizer_.classes_
+    clf.estimators_ = estimators
+    if hasattr(estimators[0], "n_features_in_"):
+        clf.n_features_in_ = estimators[0].n_features_in_
+    return clf
+
+
+def fit_fields(
+    X,
+    targets: Dict[str, tuple],
+    n_jobs: int = 1,
+    blas_threads: Optional[int] = None,
+):
+    """Train every (field, label) classifier in one worker pool.
+
+    targets maps field -> (y, all_labels). Returns (models, timings) where
+    timings maps field -> {label: fit seconds}.
+    """
+    prepared = {field: prepare_field(y, all_labels) for field, (y, all_labels) in targets.items()}
+    jobs = [
+        (field, j)
+        for field, (mlb, active_labels, always_on, Y) in prepared.items()
+        for j in range(len(active_labels))
+    ]
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(fit_label)(X, prepared[field][3][:, j], blas_threads) for field, j in jobs
+    )
+
+    fitted: Dict[str, list] = {field: [] for field in prepared}
+    timings: Dict[str, Dict[str, float]] = {field: {} for field in prepared}
+    for (field, j), (est, seconds) in zip(jobs, results):
+        fitted[field].append(est)
+        timings[field][prepared[field][1][j]] = seconds
 
-    vec = TfidfVectorizer(ngram_range=(1, 2), min_df=1, max_df=0.95)
-    X = vec.fit_transform(texts)
+    models = {}
+    for field, (mlb, active_labels, always_on, Y) in prepared.items():
+        clf = assemble_ovr(fitted[field], Y) if active_labels else None
+        models[field] = (clf, mlb, active_labels, always_on)
+    return models, timings
 
-    if not active_labels:
-        return vec, None, mlb, active_labels, always_on
 
-    clf = OneVsRestClassifier(LogisticRegression(max_iter=2000))
-    clf.fit(X, Y)
-    return vec, clf, mlb, active_labels, always_on
+def fit_field(X, y: List[List[str]], all_labels: List[str]):
+    models, _ = fit_fields(X, {"_": (y, all_labels)})
+    return models["_"]
 
 
-def predict_field(vec, clf, mlb, texts: List[str], threshold: float = 0.5):
+def predict_field(clf, mlb, X, threshold: float = 0.5):
+    """Predict one field from a feature matrix produced by the shared vectorizer."""
     if clf is None:
-        empty = [[] for _ in texts]
-        probs = np.zeros((len(texts), 0))
+        empty = [[] for _ in range(X.shape[0])]
+        probs = np.zeros((X.shape[0], 0))
         return empty, probs, list(mlb.classes_)
 
-    X = vec.transform(texts)
     # decision_function works for LR; fallback to predict_proba
     if hasattr(clf, "predict_proba"):
         probs = clf.predict_proba(X)
@@ -81,12 +170,12 @@ def predict_field(vec, clf, mlb, texts: List[str], threshold: float = 0.5):
     return pred_labels, probs, list(mlb.classes_)
 
 
-def top_sentence_indices(vec: TfidfVectorizer, text: str, top_k: int = 3) -> List[int]:
-    sentences = split_sentences(text)
-    if not sentences:
-        return []
-    X = vec.transform(sentences)
-    scores = np.asarray(X.sum(axis=1)).ravel()
+def label_coefficients(clf) -> np.ndarray:
+    """Stack the per-label logistic-regression weights into a (n_features x n_labels) matrix."""
+    return np.vstack([est.coef_.ravel() for est in clf.estimators_]).T
+
+
+def rank_indices(scores: np.ndarray, top_k: int = 3) -> List[int]:
     top_idx = np.argsort(scores)[-top_k:][::-1]
     return [int(i) for i in top_idx if scores[i] > 0]
 
@@ -97,68 +186,205 @@ def filter_records(records: List[dict], ids: Optional[set]) -> List[dict]:
     return [r for r in records if r.get("incident_id") in ids]
 
 
+def train_models(
+    train_records: List[dict],
+    label_space: Dict[str, List[str]],
+    n_jobs: int = 1,
+    blas_threads: Optional[int] = None,
+):
+    """Fit the shared vectorizer and per-field classifiers; returns (vec, models, timings)."""
+    train_texts = [r["text"] for r in train_records]
+    vec, X_train = fit_vectorizer(train_texts)
+
+    targets = {
+        field: ([r.get("labels", {}).get(field, []) for r in train_records], label_space[field])
+        for field in FIELDS
+    }
+    models, timings = fit_fields(X_train, targets, n_jobs=n_jobs, blas_threads=blas_threads)
+    return vec, models, timings
+
+
+def timing_summary(timings: Dict[str, Dict[str, float]], top: int = 3) -> str:
+    """Per-field training seconds with the slowest labels."""
+    lines = ["Training time (s):"]
+    for field, per_label in timings.items():
+        slowest = sorted(per_label.items(), key=lambda x: x[1], reverse=True)[:top]
+        detail = ", ".join(f"{label}={seconds:.3f}" for label, seconds in slowest)
+        lines.append(f"  {field}: {sum(per_label.values()):.3f} over {len(per_label)} labels ({detail})")
+    return "\n".join(lines)
+
+
+def save_models(path: Path, vec: TfidfVectorizer, models: Dict[str, tuple]) -> None:
+    """Write a versioned artifact (uncompressed, so arrays can be memory-mapped on load)."""
+    artifact = {
+        "format_version": ARTIFACT_VERSION,
+        "package_version": __version__,
+        "sklearn_version": sklearn.__version__,
+        "vectorizer": vec,
+        "fields": {
+            field: {"clf": clf, "mlb": mlb, "active_labels": active_labels, "always_on": always_on}
+            for field, (clf, mlb, active_labels, always_on) in models.items()
+        },
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump(artifact, path)
+
+
+def load_models(path: Path, mmap: bool = True):
+    """Load an artifact written by save_models; returns (vec, models)."""
+    artifact = joblib.load(path, mmap_mode="r" if mmap else None)
+    version = artifact.get("format_version") if isinstance(artifact, dict) else None
+    if version != ARTIFACT_VERSION:
+        raise ValueError(
+            f"Unsupported tfidf model artifact version {version!r} in {path} (expected {ARTIFACT_VERSION})."
+        )
+    if artifact.get("sklearn_version") != sklearn.__version__:
+        print(
+            f"Warning: {path} was trained with scikit-learn {artifact.get('sklearn_version')}, "
+            f"running {sklearn.__version__}."
+        )
+    models = {
+        field: (entry["clf"], entry["mlb"], entry["active_labels"], entry["always_on"])
+        for field, entry in artifact["fields"].items()
+    }
+    return artifact["vectorizer"], models
+
+
+def predict_records(
+    vec: TfidfVectorizer,
+    models: Dict[str, tuple],
+    records: Iterable[dict],
+    threshold: float = 0.5,
+    chunk_size: int = 1024,
+) -> Iterator[dict]:
+    """Yield prediction cards in input order, scoring chunk_size records per matrix.
+
+    Evidence: all sentences of a chunk are transformed once and scored against
+    each label's coefficient vector (S @ W), giving per-label top-3 sentences.
+    Labels without a classifier (always_on) fall back to raw TF–IDF mass.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be >= 1, got {chunk_size}.")
+    coefs = {
+        field: label_coefficients(clf)
+        for field, (clf, mlb, active_labels, always_on) in models.items()
+        if clf is not None
+    }
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        texts = [rec["text"] for rec in chunk]
+        X = vec.transform(texts)
+        field_preds = {
+            field: predict_field(clf, mlb, X, threshold=threshold)
+            for field, (clf, mlb, active_labels, always_on) in models.items()
+        }
+
+        sentences: List[str] = []
+        offsets = [0]
+        for text in texts:
+            sentences.extend(split_sentences(text))
+            offsets.append(len(sentences))
+        # a chunk of empty-text records has no sentences; sklearn rejects 0-sample input
+        S = vec.transform(sentences) if sentences else sparse.csr_matrix((0, X.shape[1]))
+        mass = np.asarray(S.sum(axis=1)).ravel()
+        sentence_scores = {field: np.asarray(S @ W) for field, W in coefs.items()}
+
+        for i, rec in enumerate(chunk):
+            pred = {"incident_id": rec["incident_id"], "pred": {}, "confidence": {}, "evidence": {}}
+            start, end = offsets[i], offsets[i + 1]
+            for field, (clf, mlb, active_labels, always_on) in models.items():
+                labels, probs, classes = field_preds[field]
+                labels = list(labels[i]) if labels else []
+                labels = sorted(set(labels + always_on))
+                # confidences: map label -> prob
+                conf = {cls: float(p) for cls, p in zip(classes, probs[i])} if probs.size else {}
+                for label in always_on:
+                    conf[label] = 1.0
+                pred["pred"][field] = labels
+                pred["confidence"][field] = {k: v for k, v in conf.items() if k in labels}
+                evidence = {}
+                for label in labels:
+                    if clf is not None and label in classes:
+                        scores = sentence_scores[field][start:end, classes.index(label)]
+                    else:
+                        scores = mass[start:end]
+                    evidence[label] = rank_indices(scores, top_k=3)
+                pred["evidence"][field] = evidence
+            yield pred
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--data", default=None, help="Optional path used for both train/test")
     ap.add_argument("--train", default=None, help="Training JSONL (defaults to --data)")
     ap.add_argument("--test", default=None, help="Test JSONL (defaults to --data)")
     ap.add_argument("--schema", default="data/schema.yaml")
-    ap.add_argument("--out", required=True)
+    ap.add_argument("--out", default=None, help="Predictions JSONL (omit to only train)")
     ap.add_argument("--threshold", type=float, default=0.5)
     ap.add_argument("--split", default=None, help="Optional split.json with train/test ids")
+    ap.add_argument("--save-model", default=None, help="Write the fitted model artifact here")
+    ap.add_argument("--model", default=None, help="Load a saved artifact instead of training")
+    ap.add_argument("--chunk-size", type=int, default=1024, help="Test records scored per batch")
+    ap.add_argument("--n-jobs", type=int, default=1, help="Workers for per-label training (-1 = all cores)")
+    ap.add_argument(
+        "--blas-threads",
+        type=int,
+        default=None,
+        help="BLAS/OpenMP threads per training job (default: 1 when --n-jobs != 1)",
+    )
+    ap.add_argument("--timings-out", default=None, help="Optional JSON of per-label training seconds")
     args = ap.parse_args()
 
-    schema = yaml.safe_load(Path(args.schema).read_text(encoding="utf-8"))
-    label_space = schema["labels"]
+    if not args.out and not args.save_model:
+        raise ValueError("Provide --out and/or --save-model.")
+    if args.model and args.save_model:
+        raise ValueError("--model loads an existing artifact; it cannot be combined with --save-model.")
+    if args.chunk_size < 1:
+        raise ValueError(f"--chunk-size must be >= 1, got {args.chunk_size}.")
 
     data_path = args.data
     train_path = args.train or data_path
     test_path = args.test or data_path
-    if not train_path or not test_path:
-        raise ValueError("Provide --data or both --train/--test paths.")
-
-    train_records = load_jsonl(train_path)
-    test_records = load_jsonl(test_path)
+    if not args.model and not train_path:
+        raise ValueError("Provide --data or --train (or --model to skip training).")
+    if args.out and not test_path:
+        raise ValueError("Provide --data or --test to predict.")
 
     split = load_split(args.split)
     train_ids = set(split.get("train", [])) if split else None
     test_ids = set(split.get("test", [])) if split else None
 
-    train_records = filter_records(train_records, train_ids)
-    test_records = filter_records(test_records, test_ids)
-
-    train_texts = [r["text"] for r in train_records]
-
-    models = {}
-    for field in ["subsystem", "failure_mode", "impact", "cause"]:
-        y = [r.get("labels", {}).get(field, []) for r in train_records]
-        vec, clf, mlb, active_labels, always_on = fit_field(train_texts, y, label_space[field])
-        models[field] = (vec, clf, mlb, active_labels, always_on)
+    if args.model:
+        vec, models = load_models(Path(args.model))
+    else:
+        schema = yaml.safe_load(Path(args.schema).read_text(encoding="utf-8"))
+        label_space = schema["labels"]
+        train_records = filter_records(load_jsonl(train_path), train_ids)
+        blas_threads = args.blas_threads or (1 if args.n_jobs != 1 else None)
+        vec, models, timings = train_models(train_records, label_space, args.n_jobs, blas_threads)
+        print(timing_summary(timings))
+        if args.timings_out:
+            Path(args.timings_out).parent.mkdir(parents=True, exist_ok=True)
+            Path(args.timings_out).write_text(json.dumps(timings, indent=2), encoding="utf-8")
+        if args.save_model:
+            save_models(Path(args.save_model), vec, models)
+            print(f"Saved tfidf model -> {args.save_model}")
+
+    if not args.out:
+        return
+
+    test_records = iter_jsonl(test_path)
+    if test_ids:
+        test_records = (r for r in test_records if r.get("incident_id") in test_ids)
 
     out_path = Path(args.out)
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
     with out_path.open("w", encoding="utf-8") as f:
-        for rec in test_records:
-            text = rec["text"]
-            pred = {"incident_id": rec["incident_id"], "pred": {}, "confidence": {}, "evidence": {}}
-            sentence_indices = {}
-            for field, (vec, clf, mlb, active_labels, always_on) in models.items():
-                labels, probs, classes = predict_field(vec, clf, mlb, [text], threshold=args.threshold)
-                labels = list(labels[0]) if labels else []
-                labels = sorted(set(labels + always_on))
-                # confidences: map label -> prob
-                conf = {cls: float(p) for cls, p in zip(classes, probs[0])} if probs.size else {}
-                for label in always_on:
-                    conf[label] = 1.0
-                pred["pred"][field] = labels
-                pred["confidence"][field] = {k: v for k, v in conf.items() if k in labels}
-                # evidence: top sentence indices by tf-idf weight (shared across labels)
-                if field not in sentence_indices:
-                    sentence_indices[field] = top_sentence_indices(vec, text, top_k=3)
-                pred["evidence"][field] = {
-                    label: sentence_indices[field] for label in labels
-                }
+        for pred in predict_records(vec, models, test_records, args.threshold, args.chunk_size):
             f.write(json.dumps(pred, ensure_ascii=False) + "\n")
 
     print(f"Wrote tfidf predictions to {out_path}")
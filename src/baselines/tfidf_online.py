@@ -0,0 +1,126 @@
+"""
+tfidf_online.py
+---------------
+Out-of-core training for the TF–IDF baseline.
+
+The batch baseline (tfidf_baseline.py) needs every training text and the full
+label matrix in memory. This variant streams JSONL in minibatches instead:
+
+- features: a stateless HashingVectorizer (1–2 grams) re-weighted by IDF
+  statistics that are accumulated in a first streaming pass
+- classifiers: one SGDClassifier (log loss) per label, trained with partial_fit
+
+The written artifact has the same layout as `tfidf_baseline --save-model`,
+so prediction goes through the existing path:
+
+  python -m src.baselines.tfidf_online --train data/processed/incidents.jsonl \
+    --split outputs/split.json --save-model outputs/tfidf_online.joblib
+  python -m src.baselines.tfidf_online --update outputs/tfidf_online.joblib \
+    --train new_labeled.jsonl --save-model outputs/tfidf_online.joblib
+  python -m src.baselines.tfidf_baseline --model outputs/tfidf_online.joblib \
+    --data data/processed/incidents.jsonl --out outputs/tfidf_online_preds.jsonl
+
+Updating folds the new documents into the IDF statistics and continues
+partial_fit on the existing classifiers; nothing is retrained from scratch.
+"""
+
+import argparse
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import yaml
+from sklearn.preprocessing import MultiLabelBinarizer
+
+from src.baselines.online_models import IncrementalOneVsRest, StreamingTfidfVectorizer
+from src.baselines.tfidf_baseline import FIELDS, iter_jsonl, load_models, load_split, save_models
+
+
+def init_models(label_space: Dict[str, List[str]], alpha: float = 1e-4) -> Dict[str, tuple]:
+    """Empty per-field models over the full schema label list (no always_on in streaming mode)."""
+    models = {}
+    for field in FIELDS:
+        labels = list(label_space[field])
+        mlb = MultiLabelBinarizer(classes=labels).fit([labels])
+        models[field] = (IncrementalOneVsRest(len(labels), alpha=alpha), mlb, labels, [])
+    return models
+
+
+def iter_batches(records: Iterable[dict], batch_size: int) -> Iterator[List[dict]]:
+    records = iter(records)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def stream_records(path: str, ids: Optional[set]) -> Iterator[dict]:
+    for rec in iter_jsonl(path):
+        if not rec.get("text") or not rec.get("labels"):
+            continue
+        if ids and rec.get("incident_id") not in ids:
+            continue
+        yield rec
+
+
+def fit_stream(
+    path: str,
+    vec: StreamingTfidfVectorizer,
+    models: Dict[str, tuple],
+    ids: Optional[set] = None,
+    batch_size: int = 1000,
+    epochs: int = 1,
+) -> int:
+    """Two streaming passes: IDF statistics, then partial_fit. Returns the number of documents seen."""
+    n_new = 0
+    for batch in iter_batches(stream_records(path, ids), batch_size):
+        vec.partial_fit([r["text"] for r in batch])
+        n_new += len(batch)
+    vec.finalize()
+
+    for _ in range(epochs):
+        for batch in iter_batches(stream_records(path, ids), batch_size):
+            X = vec.transform([r["text"] for r in batch])
+            for field, (clf, mlb, active_labels, always_on) in models.items():
+                Y = mlb.transform([r.get("labels", {}).get(field, []) for r in batch])
+                clf.partial_fit(X, Y)
+    return n_new
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--train", required=True, help="Training JSONL (streamed)")
+    ap.add_argument("--schema", default="data/schema.yaml")
+    ap.add_argument("--split", default=None, help="Optional split.json; trains on its train ids")
+    ap.add_argument("--save-model", required=True, help="Artifact path (tfidf_baseline --model format)")
+    ap.add_argument("--update", default=None, help="Existing streaming artifact to continue training")
+    ap.add_argument("--batch-size", type=int, default=1000)
+    ap.add_argument("--epochs", type=int, default=1)
+    # None marks "not given": both are fixed by the artifact when continuing with --update
+    ap.add_argument("--n-features", type=int, default=None, help="Hashing dimension (default 2**18)")
+    ap.add_argument("--alpha", type=float, default=None, help="SGD L2 regularization strength (default 1e-4)")
+    args = ap.parse_args()
+
+    split = load_split(args.split)
+    train_ids = set(split.get("train", [])) if split else None
+
+    if args.update:
+        fixed = [flag for flag, value in (("--n-features", args.n_features), ("--alpha", args.alpha)) if value is not None]
+        if fixed:
+            raise ValueError(f"{' and '.join(fixed)} cannot change with --update; the artifact keeps its original values.")
+        vec, models = load_models(Path(args.update), mmap=False)
+        if not isinstance(vec, StreamingTfidfVectorizer):
+            raise ValueError(f"{args.update} was not written by tfidf_online; it cannot be updated.")
+    else:
+        schema = yaml.safe_load(Path(args.schema).read_text(encoding="utf-8"))
+        vec = StreamingTfidfVectorizer(n_features=args.n_features or 2**18)
+        models = init_models(schema["labels"], alpha=1e-4 if args.alpha is None else args.alpha)
+
+    n_new = fit_stream(args.train, vec, models, train_ids, args.batch_size, args.epochs)
+    save_models(Path(args.save_model), vec, models)
+    print(f"Trained on {n_new} documents ({vec.n_docs} total) -> {args.save_model}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,12 @@ Run:
 
 It can:
 - Accept raw incident text
-- Run either: keyword baseline OR load model predictions from a JSONL file
+- Run either: keyword baseline OR a running model server (src/models/serve.py)
 - Render an incident card with evidence snippets
 
 For quick demo, use keyword baseline on-the-fly (no training needed).
+The model server keeps the trained checkpoints warm between cards:
+  python -m src.models.serve --model_dir outputs/deberta_multilabel
 """
 
 import json
@@ -18,17 +20,25 @@ import re
 from pathlib import Path
 from typing import Dict, List
 
+import requests
 import streamlit as st
 import yaml
 
-from src.baselines.keyword_baseline import score_labels, KEYWORDS, split_sentences
+from src.baselines.keyword_baseline import score_fields
+from src.utils import split_sentence_spans
 
 
 def load_schema(path: str = "data/schema.yaml") -> Dict:
     return yaml.safe_load(Path(path).read_text(encoding="utf-8"))
 
 
-def card_section(title: str, labels: List[str], evidence: Dict[str, List[str]], confidence: Dict[str, float]):
+def card_section(
+    title: str,
+    labels: List[str],
+    evidence: Dict[str, List],
+    confidence: Dict[str, float],
+    sentences: List[str],
+):
     st.subheader(title)
     if not labels:
         st.write("_None_")
@@ -39,14 +49,14 @@ def card_section(title: str, labels: List[str], evidence: Dict[str, List[str]],
         st.markdown(badge)
         ev = evidence.get(lab, [])
         if ev:
-            for s in ev:
-                st.markdown(f"> {s}")
+            for item in ev:
+                # keyword baseline cites sentence indices, model cards cite sentences
+                st.markdown(f"> {sentences[item] if isinstance(item, int) else item}")
 
 
 def run_keyword(text: str):
     pred = {"pred": {}, "confidence": {}, "evidence": {}}
-    for field in ["subsystem", "failure_mode", "impact", "cause"]:
-        labels, conf, evid = score_labels(text, KEYWORDS.get(field, {}))
+    for field, (labels, conf, evid) in score_fields(text).items():
         pred["pred"][field] = labels
         # flatten conf dict for labels only
         pred["confidence"][field] = {k: v for k, v in conf.items() if k in labels}
@@ -54,6 +64,12 @@ def run_keyword(text: str):
     return pred
 
 
+def run_server(text: str, url: str):
+    resp = requests.post(f"{url.rstrip('/')}/predict", json={"incident_id": "demo", "text": text}, timeout=60)
+    resp.raise_for_status()
+    return resp.json()
+
+
 st.set_page_config(page_title="Starship Anomaly Explainer", layout="wide")
 st.title("Starship Anomaly Explainer 🚀")
 st.caption("Paste an incident narrative and get a structured, evidence-grounded card.")
@@ -71,23 +87,33 @@ with col1:
     )
 
 with col2:
-    mode = st.radio("Mode", ["Keyword baseline (instant)"], index=0)
+    mode = st.radio("Mode", ["Keyword baseline (instant)", "Model server"], index=0)
+    server_url = st.text_input("Server URL", value="http://127.0.0.1:8765", disabled=mode != "Model server")
 
 if st.button("Generate card"):
-    pred = run_keyword(text)
+    if mode == "Model server":
+        try:
+            pred = run_server(text, server_url)
+        except requests.RequestException as exc:
+            st.error(f"Model server request failed: {exc}")
+            st.stop()
+    else:
+        pred = run_keyword(text)
+    # verbatim slices of the input text, indexed like the evidence
+    sentences = [text[start:end] for start, end in split_sentence_spans(text)]
 
     st.divider()
     st.header("What happened?")
 
     c1, c2, c3, c4 = st.columns(4)
     with c1:
-        card_section("Subsystem", pred["pred"]["subsystem"], pred["evidence"]["subsystem"], pred["confidence"]["subsystem"])
+        card_section("Subsystem", pred["pred"].get("subsystem", []), pred["evidence"].get("subsystem", {}), pred["confidence"].get("subsystem", {}), sentences)
     with c2:
-        card_section("Failure mode", pred["pred"]["failure_mode"], pred["evidence"]["failure_mode"], pred["confidence"]["failure_mode"])
+        card_section("Failure mode", pred["pred"].get("failure_mode", []), pred["evidence"].get("failure_mode", {}), pred["confidence"].get("failure_mode", {}), sentences)
     with c3:
-        card_section("Impact", pred["pred"]["impact"], pred["evidence"]["impact"], pred["confidence"]["impact"])
+        card_section("Impact", pred["pred"].get("impact", []), pred["evidence"].get("impact", {}), pred["confidence"].get("impact", {}), sentences)
     with c4:
-        card_section("Cause (hyp.)", pred["pred"]["cause"], pred["evidence"]["cause"], pred["confidence"]["cause"])
+        card_section("Cause (hyp.)", pred["pred"].get("cause", []), pred["evidence"].get("cause", {}), pred["confidence"].get("cause", {}), sentences)
 
     st.divider()
     st.subheader("Raw JSON")
@@ -71,29 +71,12 @@ def metrics_to_markdown(report: dict) -> str:
     return "\n".join(lines) + "\n"
 
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--gold", required=True)
-    ap.add_argument("--pred", required=True)
-    ap.add_argument("--schema", default="data/schema.yaml")
-    ap.add_argument("--split", default=None, help="Optional split.json to evaluate on test IDs")
-    ap.add_argument("--out", default="outputs/metrics.json")
-    ap.add_argument("--md-out", default="outputs/metrics.md")
-    args = ap.parse_args()
-
-    schema = yaml.safe_load(Path(args.schema).read_text(encoding="utf-8"))
-    label_space = schema["labels"]
+def compute_report(gold: Dict[str, dict], pred: Dict[str, dict], label_space: Dict[str, List[str]]) -> dict:
+    """Per-field micro/macro metrics of pred vs gold records, both keyed by incident_id.
 
-    gold = {r["incident_id"]: r for r in load_jsonl(args.gold)}
-    pred = {r["incident_id"]: r for r in load_jsonl(args.pred)}
-
-    split = load_split(args.split)
-    test_ids = split.get("test") if split else None
-
-    gold = filter_ids(gold, test_ids)
-    pred = filter_ids(pred, test_ids)
-
-    fields = ["subsystem", "failure_mode", "impact", "cause"]
+    Only fields present in label_space are scored.
+    """
+    fields = [field for field in ["subsystem", "failure_mode", "impact", "cause"] if field in label_space]
     report = {"n": len(gold), "fields": {}}
 
     for field in fields:
@@ -134,6 +117,33 @@ def main():
             "per_label": per_label,
         }
 
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--gold", required=True)
+    ap.add_argument("--pred", required=True)
+    ap.add_argument("--schema", default="data/schema.yaml")
+    ap.add_argument("--split", default=None, help="Optional split.json to evaluate on test IDs")
+    ap.add_argument("--out", default="outputs/metrics.json")
+    ap.add_argument("--md-out", default="outputs/metrics.md")
+    args = ap.parse_args()
+
+    schema = yaml.safe_load(Path(args.schema).read_text(encoding="utf-8"))
+    label_space = schema["labels"]
+
+    gold = {r["incident_id"]: r for r in load_jsonl(args.gold)}
+    pred = {r["incident_id"]: r for r in load_jsonl(args.pred)}
+
+    split = load_split(args.split)
+    test_ids = split.get("test") if split else None
+
+    gold = filter_ids(gold, test_ids)
+    pred = filter_ids(pred, test_ids)
+
+    report = compute_report(gold, pred, label_space)
+
     out_path = Path(args.out)
     out_path.parent.mkdir(parents=True, exist_ok=True)
     out_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
@@ -0,0 +1,236 @@
+"""
+distill.py
+----------
+Distill a trained teacher (per-field checkpoints or a multitask model) into a
+small shared-encoder student for the high-volume tier.
+
+The student is a MultiTaskClassifier over every field the teacher predicts,
+trained with the train_multilabel_deberta trainer on the teacher's sigmoid
+outputs (optionally mixed with gold labels). Unlabeled records can be used
+too, since targets come from the teacher. The encoder is either a small
+pretrained model (e.g. a MiniLM, with --student_layers 0) or the first
+--student_layers layers (default 4) of a BERT-style encoder.
+
+Example:
+  python -m src.models.distill \
+    --data data/processed/incidents.jsonl --split outputs/split.json \
+    --teacher_dir outputs/deberta_multilabel \
+    --student_model microsoft/deberta-v3-base --student_layers 4 \
+    --output_dir outputs/student
+
+The student is saved as <output_dir>/multitask/best, so
+`predict.py --model_dir <output_dir>` loads it directly. A comparison report
+(evaluate.py micro/macro F1 on the held-out records, latency per document,
+parameters and checkpoint size) is written to <output_dir>/distill_report.{json,md}.
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import yaml
+from datasets import Dataset
+from torch import nn
+from transformers import AutoModel, AutoTokenizer
+
+from src.eval.evaluate import compute_report, load_split
+from src.models.multitask import MultiTaskClassifier
+from src.models.predict import iter_scorers, make_card, score_fields
+from src.models.train_multilabel_deberta import (
+    add_checkpoint_args,
+    add_speed_args,
+    build_trainer,
+    load_jsonl,
+    make_multitask_dataset,
+)
+
+
+def load_student_encoder(name_or_path: str, layers: int = 0) -> nn.Module:
+    """Pretrained encoder, keeping only its first `layers` layers (0 keeps all)."""
+    encoder = AutoModel.from_pretrained(name_or_path)
+    if layers:
+        blocks = getattr(getattr(encoder, "encoder", None), "layer", None)
+        if not isinstance(blocks, nn.ModuleList):
+            raise ValueError(
+                f"--student_layers needs a BERT-style encoder (encoder.layer); {type(encoder).__name__} "
+                f"has none. Pass --student_layers 0 with an already small pretrained model."
+            )
+        if not 0 < layers <= len(blocks):
+            raise ValueError(f"--student_layers must be in [1, {len(blocks)}] for {name_or_path}, got {layers}")
+        encoder.encoder.layer = nn.ModuleList(blocks[:layers])
+        encoder.config.num_hidden_layers = layers
+    return encoder
+
+
+def soft_targets(
+    field_probs: Dict[str, np.ndarray],
+    field_labels: Dict[str, List[str]],
+    records: List[Dict],
+    gold_weight: float = 0.0,
+) -> np.ndarray:
+    """Teacher probabilities in field order, mixed with gold labels where records have them."""
+    targets = np.concatenate([field_probs[field] for field in field_labels], axis=1)
+    if gold_weight <= 0:
+        return targets
+    for i, rec in enumerate(records):
+        if not rec.get("labels"):
+            continue
+        gold = []
+        for field, labels in field_labels.items():
+            labs = set(rec["labels"].get(field, []))
+            gold.extend(1.0 if lab in labs else 0.0 for lab in labels)
+        targets[i] = gold_weight * np.asarray(gold, dtype=np.float32) + (1 - gold_weight) * targets[i]
+    return targets
+
+
+def checkpoint_bytes(model_root: Path) -> int:
+    """Bytes of the best/ checkpoints predict.py would load (ONNX exports excluded)."""
+    total = 0
+    for best in model_root.glob("*/best"):
+        total += sum(p.stat().st_size for p in best.rglob("*") if p.is_file() and "onnx" not in p.parts)
+    return total
+
+
+def benchmark(model_root: Path, label_space: Dict[str, List[str]], records: List[Dict], args) -> dict:
+    """evaluate.py metrics, latency and size of the model(s) under model_root on the given records."""
+    scorers = list(iter_scorers(model_root, label_space))
+    params = sum(p.numel() for model, _, _ in scorers for p in model.parameters())
+    texts = [rec["text"] for rec in records]
+
+    start = time.perf_counter()
+    field_probs, field_labels, field_evidence = score_fields(
+        scorers, texts, args.max_length, args.batch_size, args.pooling, args.stride
+    )
+    seconds = time.perf_counter() - start
+
+    pred = {
+        rec["incident_id"]: make_card(rec, i, field_probs, field_labels, field_evidence, args.threshold)
+        for i, rec in enumerate(records)
+    }
+    gold = {rec["incident_id"]: rec for rec in records}
+    report = compute_report(gold, pred, label_space)
+    fields = report["fields"]
+    return {
+        "micro_f1": {field: m["micro_f1"] for field, m in fields.items()},
+        "macro_f1": {field: m["macro_f1"] for field, m in fields.items()},
+        "mean_micro_f1": float(np.mean([m["micro_f1"] for m in fields.values()])) if fields else 0.0,
+        "ms_per_doc": 1000 * seconds / max(len(texts), 1),
+        "parameters": int(params),
+        "checkpoint_mb": checkpoint_bytes(model_root) / 1e6,
+    }
+
+
+def report_to_markdown(report: dict) -> str:
+    teacher, student = report["teacher"], report["student"]
+    lines = ["# Distillation report", ""]
+    lines.append(f"Evaluated on {report['n_eval']} held-out incidents; student trained on {report['n_train']} records.")
+    lines.append("")
+    lines.append("| Metric | Teacher | Student |")
+    lines.append("| --- | --- | --- |")
+    for field in student["micro_f1"]:
+        lines.append(f"| {field} micro F1 | {teacher['micro_f1'].get(field, 0):.3f} | {student['micro_f1'][field]:.3f} |")
+        lines.append(f"| {field} macro F1 | {teacher['macro_f1'].get(field, 0):.3f} | {student['macro_f1'][field]:.3f} |")
+    lines.append(f"| Mean micro F1 | {teacher['mean_micro_f1']:.3f} | {student['mean_micro_f1']:.3f} |")
+    lines.append(f"| Latency (ms/doc) | {teacher['ms_per_doc']:.1f} | {student['ms_per_doc']:.1f} |")
+    lines.append(f"| Parameters (M) | {teacher['parameters'] / 1e6:.2f} | {student['parameters'] / 1e6:.2f} |")
+    lines.append(f"| Checkpoint size (MB) | {teacher['checkpoint_mb']:.1f} | {student['checkpoint_mb']:.1f} |")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data", required=True, help="JSONL incidents (unlabeled records are used for distillation)")
+    ap.add_argument("--schema", default="data/schema.yaml")
+    ap.add_argument("--split", default=None, help="Optional split.json; its test ids are held out for the report")
+    ap.add_argument("--teacher_dir", required=True, help="Any model_dir predict.py can load")
+    ap.add_argument("--student_model", default="microsoft/deberta-v3-base", help="Student encoder name or path")
+    ap.add_argument("--student_layers", type=int, default=4, help="Keep only the first N encoder layers (0: all)")
+    ap.add_argument("--output_dir", default="outputs/student")
+    ap.add_argument("--gold_weight", type=float, default=0.0, help="Weight of gold labels in the targets (0: teacher only)")
+    ap.add_argument("--epochs", type=int, default=6)
+    ap.add_argument("--batch_size", type=int, default=16)
+    ap.add_argument("--lr", type=float, default=5e-5)
+    ap.add_argument("--max_length", type=int, default=512)
+    ap.add_argument("--stride", type=int, default=128)
+    ap.add_argument("--pooling", choices=["max", "mean", "truncate"], default="max")
+    ap.add_argument("--threshold", type=float, default=0.5)
+    add_speed_args(ap)
+    add_checkpoint_args(ap)
+    args = ap.parse_args()
+
+    if not 0 <= args.gold_weight <= 1:
+        raise ValueError(f"--gold_weight must be in [0, 1], got {args.gold_weight}")
+    if args.student_layers < 0:
+        raise ValueError(f"--student_layers must be >= 0, got {args.student_layers}")
+    schema = yaml.safe_load(Path(args.schema).read_text(encoding="utf-8"))
+    label_space = schema["labels"]
+    records = [r for r in load_jsonl(args.data) if r.get("text")]
+
+    split = load_split(args.split)
+    if split:
+        test_ids = set(split.get("test", []))
+        eval_records = [r for r in records if r.get("incident_id") in test_ids]
+        train_records = [r for r in records if r.get("incident_id") not in test_ids]
+    else:
+        # same naive 80/20 split as train_multilabel_deberta
+        cut = max(1, int(0.8 * len(records)))
+        train_records, eval_records = records[:cut], records[cut:] or records[:1]
+    eval_records = [r for r in eval_records if r.get("labels")]
+    if not eval_records:
+        raise ValueError("No labeled held-out records to evaluate on.")
+
+    # before the teacher pass, so an unsupported --student_layers fails fast
+    encoder = load_student_encoder(args.student_model, args.student_layers)
+    teacher_root = Path(args.teacher_dir)
+    start = time.perf_counter()
+    field_probs, field_labels, _ = score_fields(
+        iter_scorers(teacher_root, label_space),
+        [r["text"] for r in train_records],
+        args.max_length,
+        args.batch_size,
+        args.pooling,
+        args.stride,
+    )
+    if not field_labels:
+        raise ValueError(f"No teacher checkpoints found under {teacher_root}")
+    print(f"Teacher targets for {len(train_records)} records in {time.perf_counter() - start:.1f}s")
+
+    targets = soft_targets(field_probs, field_labels, train_records, args.gold_weight)
+    tokenizer = AutoTokenizer.from_pretrained(args.student_model)
+
+    def tokenize(batch):
+        return tokenizer(batch["text"], truncation=True, max_length=args.max_length)
+
+    train_ds = Dataset.from_dict({"text": [r["text"] for r in train_records], "labels": targets.tolist()})
+    train_ds = train_ds.map(tokenize, batched=True)
+    eval_ds = make_multitask_dataset(eval_records, field_labels).map(tokenize, batched=True)
+
+    student = MultiTaskClassifier(encoder, field_labels)
+    out_root = Path(args.output_dir)
+    out_dir = out_root / "multitask"
+    trainer = build_trainer(args, student, tokenizer, out_dir, train_ds, eval_ds)
+    trainer.train()
+    best = out_dir / "best"
+    trainer.save_final(lambda: (student.save(best), tokenizer.save_pretrained(str(best))), best)
+    trainer.report_io()
+    print(f"Saved student ({', '.join(field_labels)}) -> {out_dir / 'best'}")
+
+    # score both models on the distilled fields only; fields without a teacher would count as 0 F1
+    distilled = {field: label_space[field] for field in field_labels}
+    report = {
+        "n_train": len(train_records),
+        "n_eval": len(eval_records),
+        "teacher": benchmark(teacher_root, distilled, eval_records, args),
+        "student": benchmark(out_root, distilled, eval_records, args),
+    }
+    (out_root / "distill_report.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
+    md = report_to_markdown(report)
+    (out_root / "distill_report.md").write_text(md, encoding="utf-8")
+    print(md)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+frozen.py
+---------
+Frozen-encoder mode: each text is encoded once, the pooled embedding is
+cached on disk, and only light per-field linear heads are trained.
+
+Embeddings are the mean of the encoder's final token states over the whole
+text (non-overlapping max_length windows, so long texts are not truncated).
+They are stored in a memory-mapped float32 matrix keyed by text hash, under a
+directory per (encoder, max_length):
+
+  <cache_dir>/<key>/meta.json     encoder name, max_length, dim
+  <cache_dir>/<key>/vectors.f32   rows of float32 embeddings (np.memmap)
+  <cache_dir>/<key>/keys.txt      text hash of each row
+
+Evidence comes from the same document pass: each sentence's vector is the
+mean of its token states (the heads are linear, so this is the mean per-token
+head logit, as for the fine-tuned models). Those vectors go to a sibling
+store (unit "sentence", keys <text hash>:<sentence index>), so re-scoring an
+unchanged corpus never runs the encoder.
+
+Saved model (<output_dir>/frozen/best):
+  frozen.json   {"encoder", "max_length", "fields": {field: [labels]}, "cache_dir"}
+  heads.pt      state dict of the linear heads
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+from torch import nn
+from transformers import AutoModel, AutoTokenizer
+
+from src.models.rationales import SentenceEvidence
+from src.models.token_cache import text_hash
+from src.utils import split_sentence_spans
+
+
+class EmbeddingCache:
+    """Append-only memory-mapped text -> embedding store for one encoder setting."""
+
+    def __init__(self, cache_dir: Path, encoder: str, max_length: int, unit: str = "text"):
+        self.meta = {"encoder": encoder, "max_length": max_length}
+        if unit != "text":
+            self.meta["unit"] = unit
+        key = json.dumps(self.meta, sort_keys=True)
+        slug = encoder.rstrip("/").split("/")[-1]
+        self.root = Path(cache_dir) / f"{slug}-{hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()}"
+        self.hits = 0
+        self.misses = 0
+        self.dim: Optional[int] = None
+        self._index: Dict[str, int] = {}
+        self._vectors: Optional[np.ndarray] = None
+        meta_path = self.root / "meta.json"
+        if meta_path.exists():
+            self.dim = json.loads(meta_path.read_text(encoding="utf-8"))["dim"]
+            self._load()
+
+    def _load(self) -> None:
+        keys_path = self.root / "keys.txt"
+        keys = keys_path.read_text(encoding="utf-8").split() if keys_path.exists() else []
+        vec_path = self.root / "vectors.f32"
+        # vectors are appended before their keys, so only rows with a key are trusted
+        rows = min(len(keys), vec_path.stat().st_size // (4 * self.dim)) if vec_path.exists() else 0
+        self._index = {h: i for i, h in enumerate(keys[:rows])}
+        self._vectors = np.memmap(vec_path, dtype=np.float32, mode="r", shape=(rows, self.dim)) if rows else None
+
+    def _append(self, hashes: List[str], vectors: np.ndarray) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            (self.root / "meta.json").write_text(json.dumps({**self.meta, "dim": self.dim}), encoding="utf-8")
+        with (self.root / "vectors.f32").open("ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        with (self.root / "keys.txt").open("a", encoding="utf-8") as f:
+            f.write("".join(h + "\n" for h in hashes))
+        self._load()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def add(self, keys: Sequence[str], vectors: np.ndarray) -> None:
+        """Append rows for keys not stored yet."""
+        new = {}
+        for i, k in enumerate(keys):
+            if k not in self._index:
+                new.setdefault(k, i)
+        if new:
+            self._append(list(new), np.asarray(vectors)[list(new.values())])
+
+    def rows(self, keys: Sequence[str]) -> np.ndarray:
+        """(n_keys x dim) stored rows; every key must be present."""
+        if not keys:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.asarray(self._vectors[[self._index[k] for k in keys]])
+
+    def get(self, texts: Sequence[str], embed: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """(n_texts x dim) embeddings; texts not in the cache are embedded with `embed` and appended."""
+        hashes = [text_hash(t) for t in texts]
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in self._index:
+                missing.setdefault(h, t)
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+        if missing:
+            self._append(list(missing), embed(list(missing.values())))
+        return self.rows(hashes)
+
+
+class FrozenEncoder:
+    """Mean-pooled final token states of a frozen encoder; the model loads on first use."""
+
+    def __init__(self, name_or_path: str, max_length: int = 512, batch_size: int = 16):
+        self.name_or_path = name_or_path
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self._model = None
+        self._tokenizer = None
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        return self.encode(texts)[0]
+
+    def encode(
+        self, texts: List[str], spans: Optional[List[List[Tuple[int, int]]]] = None
+    ) -> Tuple[np.ndarray, List[np.ndarray]]:
+        """(n_texts x dim) document vectors and, given sentence spans, one (n_sentences x dim)
+        matrix per text of mean token states over each span (NaN rows for sentences without tokens)."""
+        if self._model is None:
+            self._tokenizer = AutoTokenizer.from_pretrained(self.name_or_path)
+            self._model = AutoModel.from_pretrained(self.name_or_path).eval()
+        tok = self._tokenizer
+        enc = tok(
+            texts,
+            truncation=True,
+            max_length=self.max_length,
+            stride=0,
+            return_overflowing_tokens=True,
+            return_offsets_mapping=spans is not None,
+        )
+        doc_of = np.asarray(enc["overflow_to_sample_mapping"], dtype=np.int64)
+        keys = [k for k in enc.keys() if k not in ("offset_mapping", "overflow_to_sample_mapping")]
+
+        dim = self._model.config.hidden_size
+        sums = np.zeros((len(texts), dim), dtype=np.float64)
+        counts = np.zeros(len(texts), dtype=np.float64)
+        if spans is not None:
+            # sentence rows of every text in one array; text d owns rows first[d]:first[d + 1]
+            first = np.concatenate([[0], np.cumsum([len(sp) for sp in spans])])
+            sent_sums = np.zeros((first[-1], dim), dtype=np.float64)
+            sent_counts = np.zeros(first[-1], dtype=np.float64)
+        order = sorted(range(len(doc_of)), key=lambda i: len(enc["input_ids"][i]))
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start : start + self.batch_size]
+            batch = tok.pad([{k: enc[k][i] for k in keys} for i in idx], return_tensors="pt")
+            with torch.inference_mode():
+                hidden = self._model(**batch)[0]
+            mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            np.add.at(sums, doc_of[idx], (hidden * mask).sum(dim=1).double().numpy())
+            np.add.at(counts, doc_of[idx], mask.sum(dim=(1, 2)).double().numpy())
+            if spans is None:
+                continue
+            hidden = hidden.double().numpy()
+            for row, i in enumerate(idx):
+                d = doc_of[i]
+                if not spans[d]:
+                    continue
+                # windows do not overlap, so every token is counted once
+                offsets = np.asarray(enc["offset_mapping"][i], dtype=np.int64).reshape(-1, 2)
+                starts = np.asarray([a for a, _ in spans[d]], dtype=np.int64)
+                ends = np.asarray([b for _, b in spans[d]], dtype=np.int64)
+                sent = np.searchsorted(starts, offsets[:, 0], side="right") - 1
+                keep = (offsets[:, 1] > offsets[:, 0]) & (sent >= 0) & (offsets[:, 0] < ends[np.maximum(sent, 0)])
+                np.add.at(sent_sums, first[d] + sent[keep], hidden[row, : len(offsets)][keep])
+                np.add.at(sent_counts, first[d] + sent[keep], 1)
+
+        docs = (sums / np.maximum(counts, 1)[:, None]).astype(np.float32)
+        if spans is None:
+            return docs, []
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sents = (sent_sums / sent_counts[:, None]).astype(np.float32)
+        return docs, [sents[first[d] : first[d + 1]] for d in range(len(texts))]
+
+
+def train_head(
+    X: np.ndarray, Y: np.ndarray, epochs: int = 300, lr: float = 1e-2, weight_decay: float = 1e-4
+) -> nn.Linear:
+    """Full-batch BCE training of a linear multi-label head on cached embeddings.
+
+    Features are standardized for training and the scaling is folded back into
+    the weights, so the returned head takes raw embeddings.
+    """
+    torch.manual_seed(0)
+    x = torch.from_numpy(np.ascontiguousarray(X, dtype=np.float32))
+    y = torch.from_numpy(np.ascontiguousarray(Y, dtype=np.float32))
+    mean = x.mean(dim=0)
+    std = x.std(dim=0).clamp_min(1e-6) if len(x) > 1 else torch.ones(x.shape[1])
+    head = nn.Linear(X.shape[1], Y.shape[1])
+    opt = torch.optim.AdamW(head.parameters(), lr=lr, weight_decay=weight_decay)
+    z = (x - mean) / std
+    for _ in range(epochs):
+        opt.zero_grad()
+        loss = nn.functional.binary_cross_entropy_with_logits(head(z), y)
+        loss.backward()
+        opt.step()
+    with torch.no_grad():
+        head.weight /= std
+        head.bias -= head.weight @ mean
+    return head
+
+
+class FrozenHeadClassifier(nn.Module):
+    """Linear heads per field on cached frozen-encoder embeddings."""
+
+    def __init__(
+        self,
+        encoder: str,
+        field_labels: Dict[str, List[str]],
+        max_length: int = 512,
+        cache_dir: Optional[str] = None,
+        batch_size: int = 16,
+    ):
+        super().__init__()
+        self.encoder_name = encoder
+        self.max_length = max_length
+        self.cache_dir = cache_dir
+        self.field_labels = {field: list(labels) for field, labels in field_labels.items()}
+        self.encoder = FrozenEncoder(encoder, max_length, batch_size)
+        self.heads = nn.ModuleDict({field: nn.Linear(1, len(labels)) for field, labels in self.field_labels.items()})
+        self.num_labels = sum(len(labels) for labels in self.field_labels.values())
+        self._caches: Dict[Tuple[str, str], EmbeddingCache] = {}
+
+    def cache(self, cache_dir: Optional[str] = None, unit: str = "text") -> EmbeddingCache:
+        cache_dir = cache_dir or self.cache_dir
+        if cache_dir is None:
+            raise ValueError("No embedding cache dir: pass one (predict.py --embedding_cache) or set it on the model.")
+        key = (str(cache_dir), unit)
+        if key not in self._caches:
+            self._caches[key] = EmbeddingCache(Path(cache_dir), self.encoder_name, self.max_length, unit)
+        return self._caches[key]
+
+    def embed(self, texts: Sequence[str], cache_dir: Optional[str] = None) -> np.ndarray:
+        return self.cache(cache_dir).get(texts, self.encoder)
+
+    def logits(self, X: np.ndarray) -> np.ndarray:
+        x = torch.from_numpy(np.ascontiguousarray(X, dtype=np.float32))
+        with torch.inference_mode():
+            return torch.cat([self.heads[field](x) for field in self.field_labels], dim=-1).numpy()
+
+    def score(self, texts: List[str], cache_dir: Optional[str] = None):
+        """(probs, [SentenceEvidence]) in predict_windows' format, from cached embeddings.
+
+        Texts missing a document or sentence vector get one encoder pass, which
+        fills both stores; a fully cached corpus never runs the encoder.
+        """
+        docs, sents = self.cache(cache_dir), self.cache(cache_dir, unit="sentence")
+        hashes = [text_hash(t) for t in texts]
+        spans = [split_sentence_spans(t) for t in texts]
+        sent_keys = [[f"{h}:{i}" for i in range(len(sp))] for h, sp in zip(hashes, spans)]
+        todo = {}
+        for d, h in enumerate(hashes):
+            if h not in docs or any(k not in sents for k in sent_keys[d]):
+                todo.setdefault(h, d)
+        docs.misses += len(todo)
+        docs.hits += len(texts) - len(todo)
+        if todo:
+            rows = list(todo.values())
+            doc_vecs, sent_vecs = self.encoder.encode([texts[d] for d in rows], [spans[d] for d in rows])
+            docs.add([hashes[d] for d in rows], doc_vecs)
+            new_keys = [k for d in rows for k in sent_keys[d]]
+            if new_keys:
+                sents.add(new_keys, np.concatenate(sent_vecs))
+
+        probs = 1 / (1 + np.exp(-self.logits(docs.rows(hashes))))
+        evidence = []
+        for keys in sent_keys:
+            windows = [(0, self.logits(sents.rows(keys)))] if keys else []
+            evidence.append(SentenceEvidence(windows, np.zeros(self.num_labels, dtype=np.int64)))
+        return probs.astype(np.float32), evidence
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        torch.save(self.heads.state_dict(), path / "heads.pt")
+        meta = {
+            "encoder": self.encoder_name,
+            "max_length": self.max_length,
+            "fields": self.field_labels,
+            "cache_dir": self.cache_dir,
+        }
+        (path / "frozen.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path, batch_size: int = 16) -> "FrozenHeadClassifier":
+        path = Path(path)
+        meta = json.loads((path / "frozen.json").read_text(encoding="utf-8"))
+        model = cls(meta["encoder"], meta["fields"], meta["max_length"], meta.get("cache_dir"), batch_size)
+        state = torch.load(path / "heads.pt", map_location="cpu", weights_only=True)
+        model.heads = nn.ModuleDict(
+            {field: nn.Linear(state[f"{field}.weight"].shape[1], len(labels)) for field, labels in model.field_labels.items()}
+        )
+        model.heads.load_state_dict(state)
+        return model
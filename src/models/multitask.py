@@ -0,0 +1,94 @@
+"""
+multitask.py
+------------
+One shared encoder with a linear multi-label head per field.
+
+Running subsystem, failure_mode, impact and cause through a single encoder
+costs one forward pass per document instead of four, and keeps one copy of
+the encoder weights in memory.
+
+Logits of all heads are concatenated in field order, so the model plugs into
+the same BCE trainer and metrics as the per-field models; `split_logits`
+recovers the per-field columns.
+
+Saved layout (<output_dir>/multitask/best):
+  encoder/        AutoModel.save_pretrained
+  heads.pt        state dict of the classification heads
+  multitask.json  {"fields": {field: [labels]}, "dropout": p}
+  tokenizer files
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+from torch import nn
+from transformers import AutoModel
+from transformers.modeling_outputs import SequenceClassifierOutput
+
+
+class MultiTaskClassifier(nn.Module):
+    def __init__(self, encoder: nn.Module, field_labels: Dict[str, List[str]], dropout: float = 0.1):
+        super().__init__()
+        self.encoder = encoder
+        self.config = encoder.config
+        self.field_labels = {field: list(labels) for field, labels in field_labels.items()}
+        self.dropout_p = dropout
+        self.dropout = nn.Dropout(dropout)
+        hidden = encoder.config.hidden_size
+        self.heads = nn.ModuleDict({field: nn.Linear(hidden, len(labels)) for field, labels in self.field_labels.items()})
+
+        self.field_slices = {}
+        start = 0
+        for field, labels in self.field_labels.items():
+            self.field_slices[field] = slice(start, start + len(labels))
+            start += len(labels)
+        self.num_labels = start
+
+    @classmethod
+    def from_encoder(cls, name_or_path: str, field_labels: Dict[str, List[str]], dropout: float = 0.1):
+        return cls(AutoModel.from_pretrained(name_or_path), field_labels, dropout)
+
+    def forward(
+        self,
+        input_ids: torch.Tensor,
+        attention_mask: Optional[torch.Tensor] = None,
+        token_type_ids: Optional[torch.Tensor] = None,
+        labels: Optional[torch.Tensor] = None,
+    ) -> SequenceClassifierOutput:
+        kwargs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if token_type_ids is not None:
+            kwargs["token_type_ids"] = token_type_ids
+        hidden = self.encoder(**kwargs).last_hidden_state
+        # first-token ([CLS]) pooling
+        pooled = self.dropout(hidden[:, 0])
+        logits = self.token_logits(pooled)
+        loss = None
+        if labels is not None:
+            loss = nn.functional.binary_cross_entropy_with_logits(logits, labels.float())
+        return SequenceClassifierOutput(loss=loss, logits=logits)
+
+    def token_logits(self, hidden: torch.Tensor) -> torch.Tensor:
+        """Concatenated head outputs for any (..., hidden) tensor of token states."""
+        return torch.cat([self.heads[field](hidden) for field in self.field_labels], dim=-1)
+
+    def split_logits(self, logits: np.ndarray) -> Dict[str, np.ndarray]:
+        return {field: logits[:, sl] for field, sl in self.field_slices.items()}
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        self.encoder.save_pretrained(str(path / "encoder"))
+        torch.save(self.heads.state_dict(), path / "heads.pt")
+        meta = {"fields": self.field_labels, "dropout": self.dropout_p}
+        (path / "multitask.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path) -> "MultiTaskClassifier":
+        path = Path(path)
+        meta = json.loads((path / "multitask.json").read_text(encoding="utf-8"))
+        model = cls(AutoModel.from_pretrained(str(path / "encoder")), meta["fields"], meta.get("dropout", 0.1))
+        model.heads.load_state_dict(torch.load(path / "heads.pt", map_location="cpu", weights_only=True))
+        return model
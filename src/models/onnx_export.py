@@ -0,0 +1,191 @@
+"""
+onnx_export.py
+--------------
+Export trained classifiers to ONNX (optionally int8 dynamic-quantized) for
+CPU inference with ONNX Runtime.
+
+Each <model_dir>/<field>/best (and <model_dir>/multitask/best, if present) gets:
+  best/onnx/model.onnx        fp32 graph, dynamic batch and sequence axes
+  best/onnx/model.int8.onnx   dynamic int8 weights (--quantize)
+
+Then score with:
+  python -m src.models.predict --backend onnx-int8 --parity_check ...
+
+Example:
+  python -m src.models.onnx_export --model_dir outputs/deberta_multilabel --quantize
+
+Requires the optional `onnx` and `onnxruntime` packages.
+"""
+
+import argparse
+import inspect
+import json
+from pathlib import Path
+from typing import List, Tuple
+
+import torch
+from torch import nn
+from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer
+from transformers.modeling_outputs import SequenceClassifierOutput
+
+from src.models.multitask import MultiTaskClassifier
+from src.models.rationales import forward_with_token_logits
+
+
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model.int8.onnx"}
+
+
+class _ExportWrapper(nn.Module):
+    """Positional-input wrapper; the graph outputs `logits` and per-token `token_logits` (evidence)."""
+
+    def __init__(self, model: nn.Module, input_names: List[str]):
+        super().__init__()
+        self.model = model
+        self.input_names = input_names
+
+    def forward(self, *inputs):
+        return forward_with_token_logits(self.model, dict(zip(self.input_names, inputs)))
+
+
+def _untie_initializers(path: Path) -> None:
+    """Give every extra consumer of a shared weight its own copy, in place.
+
+    The pooled logits and the per-token head use the same classifier weight;
+    the int8 quantizer rewrites each Gemm by transposing its weight in place,
+    which breaks the other consumer.
+    """
+    import onnx
+
+    graph_model = onnx.load(str(path))
+    graph = graph_model.graph
+    initializers = {init.name: init for init in graph.initializer}
+    seen = set()
+    for node in graph.node:
+        for i, name in enumerate(node.input):
+            if name not in initializers:
+                continue
+            if name in seen:
+                dup = onnx.TensorProto()
+                dup.CopyFrom(initializers[name])
+                dup.name = f"{name}.{node.name}"
+                graph.initializer.append(dup)
+                node.input[i] = dup.name
+            seen.add(name)
+    onnx.save(graph_model, str(path))
+
+
+def export_checkpoint(best_dir: Path, opset: int = 17, quantize: bool = False) -> List[Path]:
+    """Export one best/ checkpoint; returns the written .onnx paths."""
+    if (best_dir / "multitask.json").exists():
+        model = MultiTaskClassifier.load(best_dir)
+    else:
+        model = AutoModelForSequenceClassification.from_pretrained(str(best_dir))
+    model.eval()
+    tokenizer = AutoTokenizer.from_pretrained(str(best_dir))
+
+    sample = tokenizer(["Export sample.", "A second, longer export sample sentence."], padding=True, return_tensors="pt")
+    input_names = list(sample.keys())
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+    dynamic_axes["token_logits"] = {0: "batch", 1: "sequence"}
+
+    out_dir = best_dir / "onnx"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    fp32_path = out_dir / ONNX_FILES["onnx"]
+    kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        # keep the TorchScript exporter; the dynamo one needs extra packages
+        kwargs["dynamo"] = False
+    with torch.no_grad():
+        torch.onnx.export(
+            _ExportWrapper(model, input_names),
+            tuple(sample[name] for name in input_names),
+            str(fp32_path),
+            input_names=input_names,
+            output_names=["logits", "token_logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            **kwargs,
+        )
+    written = [fp32_path]
+
+    if quantize:
+        from onnx import TensorProto
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = out_dir / ONNX_FILES["onnx-int8"]
+        _untie_initializers(fp32_path)
+        quantize_dynamic(
+            str(fp32_path),
+            str(int8_path),
+            weight_type=QuantType.QInt8,
+            # shape inference cannot type the per-token head reshape
+            extra_options={"DefaultTensorType": TensorProto.FLOAT},
+        )
+        written.append(int8_path)
+    return written
+
+
+class OnnxClassifier:
+    """ONNX Runtime session with the call/output shape predict_probs expects from a torch model."""
+
+    def __init__(self, path: Path, num_labels: int, intra_op_threads: int = 0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.output_names = [o.name for o in self.session.get_outputs()]
+        self.num_labels = num_labels
+
+    def eval(self) -> "OnnxClassifier":
+        return self
+
+    def __call__(self, **inputs) -> SequenceClassifierOutput:
+        feed = {name: inputs[name].cpu().numpy() for name in self.input_names}
+        (logits,) = self.session.run(["logits"], feed)
+        return SequenceClassifierOutput(logits=torch.from_numpy(logits))
+
+    def run_with_token_logits(self, inputs) -> Tuple[torch.Tensor, torch.Tensor]:
+        if "token_logits" not in self.output_names:
+            raise ValueError("This ONNX export has no token_logits output; re-run src.models.onnx_export.")
+        feed = {name: inputs[name].cpu().numpy() for name in self.input_names}
+        logits, token_logits = self.session.run(["logits", "token_logits"], feed)
+        return torch.from_numpy(logits), torch.from_numpy(token_logits)
+
+    @classmethod
+    def from_checkpoint(cls, best_dir: Path, backend: str, intra_op_threads: int = 0) -> "OnnxClassifier":
+        path = best_dir / "onnx" / ONNX_FILES[backend]
+        if not path.exists():
+            raise FileNotFoundError(f"{path} not found; run `python -m src.models.onnx_export` first.")
+        meta_path = best_dir / "multitask.json"
+        if meta_path.exists():
+            fields = json.loads(meta_path.read_text(encoding="utf-8"))["fields"]
+            num_labels = sum(len(labels) for labels in fields.values())
+        else:
+            num_labels = AutoConfig.from_pretrained(str(best_dir)).num_labels
+        return cls(path, num_labels, intra_op_threads)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model_dir", required=True, help="Root output_dir from train script")
+    ap.add_argument("--quantize", action="store_true", help="Also write a dynamic int8 model")
+    ap.add_argument("--opset", type=int, default=17)
+    args = ap.parse_args()
+
+    model_root = Path(args.model_dir)
+    best_dirs = [model_root / name / "best" for name in ["subsystem", "failure_mode", "impact", "cause", "multitask"]]
+    best_dirs = [d for d in best_dirs if d.exists()]
+    if not best_dirs:
+        raise ValueError(f"No */best checkpoints under {model_root}")
+
+    for best_dir in best_dirs:
+        for path in export_checkpoint(best_dir, opset=args.opset, quantize=args.quantize):
+            size_mb = path.stat().st_size / 1e6
+            print(f"Exported {path} ({size_mb:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
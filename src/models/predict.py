@@ -3,108 +3,437 @@ predict.py
 ----------
 Run trained models on a JSONL file and emit predictions + evidence sentences.
 
-Evidence strategy:
-- Split into sentences
-- For each predicted label, take the top-k sentences containing any keyword from a small label->keyword map
-  (you can replace with attention/gradient rationales later)
+If <model_dir>/multitask/best exists, a single shared-encoder model
+(train_multilabel_deberta --multitask) scores all fields in one forward pass.
+If <model_dir>/frozen/best exists (train_multilabel_deberta --frozen), linear
+heads score embeddings from the frozen-encoder cache (src/models/frozen.py);
+the encoder only runs, once per text, for texts not cached yet. Otherwise one
+checkpoint per field is loaded.
+
+--backend onnx / onnx-int8 runs ONNX Runtime graphs written by
+src/models/onnx_export.py instead of eager PyTorch.
+
+Inference is batched: records are sorted by token length, padded only within
+each batch (--batch_size), and written back in input order.
+
+Narratives longer than --max_length are not truncated: they are split into
+windows overlapping by --stride tokens, windows of all records are batched
+together, and logits are pooled per record (--pooling max|mean).
+
+--token_cache reuses token ids stored by earlier training or prediction runs.
+
+--workers N splits the input into N contiguous shards scored by separate
+processes (--threads intra-op threads each); shard outputs are concatenated
+in input order and per-worker docs/sec is printed for tuning the layout.
+
+Evidence strategy (src/models/rationales.py):
+- Split into sentences (src.utils.split_sentences)
+- Score every sentence by the classifier head's logits over its final token
+  states, taken from the same forward pass as the prediction
+- For each predicted label, take the top-k sentences of the window that drove its score
 
 This keeps the demo grounded.
 """
 
 import argparse
 import json
-import re
+import multiprocessing as mp
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 import numpy as np
 import yaml
 import torch
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 
+from src.models.frozen import FrozenHeadClassifier
+from src.models.multitask import MultiTaskClassifier
+from src.models.onnx_export import OnnxClassifier
+from src.models.token_cache import TokenCache, tokenizer_fingerprint
+from src.models.rationales import SentenceEvidence, forward_with_token_logits, window_sentence_scores
+from src.utils import split_sentence_spans, split_sentences
+
+
+def predict_probs(
+    model,
+    tokenizer,
+    texts: List[str],
+    max_length: int = 512,
+    batch_size: int = 16,
+    cache: Optional[TokenCache] = None,
+) -> np.ndarray:
+    """Sigmoid probabilities (n_texts x n_labels), batched by token length.
+
+    Texts are tokenized once without padding, sorted by length, and padded only
+    to the longest sequence inside each batch. Rows come back in input order.
+    """
+    n_labels = getattr(model, "num_labels", None) or model.config.num_labels
+    probs = np.zeros((len(texts), n_labels), dtype=np.float32)
+    if not texts:
+        return probs
+
+    if cache is not None:
+        enc = cache.encode(texts, max_length)
+    else:
+        enc = tokenizer(texts, truncation=True, max_length=max_length)
+    keys = list(enc.keys())
+    order = sorted(range(len(texts)), key=lambda i: len(enc["input_ids"][i]))
+    for start in range(0, len(order), batch_size):
+        idx = order[start : start + batch_size]
+        batch = tokenizer.pad([{k: enc[k][i] for k in keys} for i in idx], return_tensors="pt")
+        with torch.inference_mode():
+            logits = model(**batch).logits.float().cpu().numpy()
+        probs[idx] = 1 / (1 + np.exp(-logits))
+    return probs
+
+
+def predict_windows(
+    model,
+    tokenizer,
+    texts: List[str],
+    max_length: int = 512,
+    batch_size: int = 16,
+    stride: int = 128,
+    pooling: str = "max",
+    cache: Optional[TokenCache] = None,
+) -> Tuple[np.ndarray, List[SentenceEvidence]]:
+    """Sliding-window probabilities and model-based sentence evidence.
+
+    Each text is cut into max_length-token windows overlapping by `stride`
+    tokens, so the window count grows linearly with text length. Windows of all
+    texts are length-sorted and batched together; their logits are pooled per
+    text (element-wise max or mean) before the sigmoid. pooling="truncate"
+    keeps only the first window of each text.
+
+    Returns (probs, evidence): probs is (n_texts x n_labels); evidence[i] holds
+    the sentence scores of text i from the window that drove each label (the
+    highest-logit window), computed in the same forward pass.
+    """
+    if pooling not in ("max", "mean", "truncate"):
+        raise ValueError(f"Unknown pooling {pooling!r}; expected 'max', 'mean' or 'truncate'.")
+    room = max_length - tokenizer.num_special_tokens_to_add()
+    if pooling != "truncate" and not 0 <= stride < room:
+        raise ValueError(f"stride must be in [0, {room}) for max_length={max_length}, got {stride}.")
+
+    n_labels = getattr(model, "num_labels", None) or model.config.num_labels
+    probs = np.zeros((len(texts), n_labels), dtype=np.float32)
+    if not texts:
+        return probs, []
+
+    if pooling == "truncate" and cache is None:
+        enc = tokenizer(texts, truncation=True, max_length=max_length, return_offsets_mapping=True)
+        enc["overflow_to_sample_mapping"] = list(range(len(texts)))
+    elif cache is not None:
+        enc = cache.encode_windows(texts, max_length, stride if pooling != "truncate" else 0)
+    else:
+        enc = tokenizer(
+            texts,
+            truncation=True,
+            max_length=max_length,
+            stride=stride,
+            return_overflowing_tokens=True,
+            return_offsets_mapping=True,
+        )
+    doc_of = np.asarray(enc["overflow_to_sample_mapping"], dtype=np.int64)
+    windows = np.arange(len(doc_of))
+    if pooling == "truncate":
+        windows = windows[np.r_[True, doc_of[1:] != doc_of[:-1]]]
+        doc_of = doc_of[windows]
+    keys = [k for k in enc.keys() if k not in ("offset_mapping", "overflow_to_sample_mapping")]
+    n_windows = len(windows)
+    spans = [split_sentence_spans(t) for t in texts]
+
+    logits = np.zeros((n_windows, n_labels), dtype=np.float32)
+    window_scores: List[Tuple[int, np.ndarray]] = [None] * n_windows
+    order = sorted(range(n_windows), key=lambda i: len(enc["input_ids"][windows[i]]))
+    for start in range(0, n_windows, batch_size):
+        idx = order[start : start + batch_size]
+        batch = tokenizer.pad([{k: enc[k][windows[i]] for k in keys} for i in idx], return_tensors="pt")
+        with torch.inference_mode():
+            batch_logits, tok_logits = forward_with_token_logits(model, batch)
+        logits[idx] = batch_logits.float().cpu().numpy()
+        tok_logits = tok_logits.float().cpu().numpy()
+        for row, i in enumerate(idx):
+            offsets = enc["offset_mapping"][windows[i]]
+            window_scores[i] = window_sentence_scores(tok_logits[row, : len(offsets)], offsets, spans[doc_of[i]])
+
+    counts = np.bincount(doc_of, minlength=len(texts))
+    if pooling == "mean":
+        pooled = np.zeros((len(texts), n_labels), dtype=np.float32)
+        np.add.at(pooled, doc_of, logits)
+        pooled /= counts[:, None]
+    else:
+        pooled = np.full((len(texts), n_labels), -np.inf, dtype=np.float32)
+        np.maximum.at(pooled, doc_of, logits)
+    probs[:] = 1 / (1 + np.exp(-pooled))
+
+    # driving window per (text, label): highest logit among that text's windows
+    evidence = []
+    first = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    for d in range(len(texts)):
+        rows = np.arange(first[d], first[d] + counts[d])
+        driver = logits[rows].argmax(axis=0)
+        evidence.append(SentenceEvidence([window_scores[r] for r in rows], driver))
+    return probs, evidence
+
+
+def iter_scorers(
+    model_root: Path, label_space: Dict[str, List[str]], backend: str = "torch", threads: int = 0
+) -> Iterator[tuple]:
+    """Yield (model, tokenizer, {field: (labels, column_slice)}) per checkpoint found.
+
+    A multitask checkpoint yields one scorer covering every field; otherwise
+    field checkpoints are loaded one at a time as the caller iterates. Frozen
+    heads yield a FrozenHeadClassifier with no tokenizer, whatever the backend.
+    """
+    frozen_path = model_root / "frozen" / "best"
+    if (frozen_path / "frozen.json").exists():
+        model = FrozenHeadClassifier.load(frozen_path)
+        fields, start = {}, 0
+        for field, labels in model.field_labels.items():
+            fields[field] = (labels, slice(start, start + len(labels)))
+            start += len(labels)
+        yield model, None, fields
+        return
+
+    multitask_path = model_root / "multitask" / "best"
+    if (multitask_path / "multitask.json").exists():
+        tokenizer = AutoTokenizer.from_pretrained(str(multitask_path))
+        meta = json.loads((multitask_path / "multitask.json").read_text(encoding="utf-8"))
+        if backend == "torch":
+            model = MultiTaskClassifier.load(multitask_path).eval()
+        else:
+            model = OnnxClassifier.from_checkpoint(multitask_path, backend, threads)
+        fields, start = {}, 0
+        for field, labels in meta["fields"].items():
+            fields[field] = (labels, slice(start, start + len(labels)))
+            start += len(labels)
+        yield model, tokenizer, fields
+        return
+
+    for field in ["subsystem", "failure_mode", "impact", "cause"]:
+        path = model_root / field / "best"
+        if path.exists():
+            if backend == "torch":
+                model = AutoModelForSequenceClassification.from_pretrained(str(path)).eval()
+            else:
+                model = OnnxClassifier.from_checkpoint(path, backend, threads)
+            tokenizer = AutoTokenizer.from_pretrained(str(path))
+            yield model, tokenizer, {field: (label_space[field], slice(None))}
 
-EVIDENCE_KWS = {
-    "heat_shield": ["heat shield", "tiles", "thermal"],
-    "raptor_engine": ["raptor", "engine"],
-    "stage_separation": ["separation", "staging", "hot-staging"],
-    "range_safety": ["FTS", "flight termination", "range safety"],
-    "loss_of_control": ["tumble", "lost control", "attitude"],
-    "comms_loss": ["telemetry", "communications", "signal"],
-    "leak": ["leak"],
-    "fire": ["fire", "flames"],
-    "explosion": ["explosion"],
-}
-
-
-def split_sentences(text: str) -> List[str]:
-    sents = re.split(r"(?<=[.!?])\s+", text.strip())
-    return [s.strip() for s in sents if s.strip()]
-
-
-def pick_evidence(text: str, labels: List[str], k: int = 3) -> Dict[str, List[str]]:
-    sents = split_sentences(text)
-    out = {}
-    for lab in labels:
-        kws = EVIDENCE_KWS.get(lab, [lab.replace("_", " ")])
-        scored = []
-        for s in sents:
-            score = sum(1 for kw in kws if kw.lower() in s.lower())
-            if score > 0:
-                scored.append((score, s))
-        scored.sort(key=lambda x: x[0], reverse=True)
-        out[lab] = [s for _, s in scored[:k]]
+
+def score_fields(
+    scorers: Iterable[tuple],
+    texts: List[str],
+    max_length: int,
+    batch_size: int,
+    pooling: str = "truncate",
+    stride: int = 128,
+    cache_dir: Optional[Path] = None,
+    embedding_cache: Optional[Path] = None,
+):
+    """Run every scorer; returns ({field: probs}, {field: labels}, {field: [SentenceEvidence per text]}).
+
+    With cache_dir, token ids come from a TokenCache (one per distinct tokenizer).
+    Frozen heads read embedding_cache, or the cache they were trained with.
+    """
+    field_probs = {}
+    field_labels = {}
+    field_evidence = {}
+    caches: Dict[str, TokenCache] = {}
+    for model, tokenizer, fields in scorers:
+        if isinstance(model, FrozenHeadClassifier):
+            probs, evidence = model.score(texts, embedding_cache)
+            emb = model.cache(embedding_cache)
+            print(f"Embedding cache {emb.root}: {emb.hits} hits, {emb.misses} encoded")
+        else:
+            cache = None
+            if cache_dir is not None:
+                fingerprint = tokenizer_fingerprint(tokenizer)
+                if fingerprint not in caches:
+                    caches[fingerprint] = TokenCache(cache_dir, tokenizer)
+                cache = caches[fingerprint]
+            probs, evidence = predict_windows(model, tokenizer, texts, max_length, batch_size, stride, pooling, cache)
+        for field, (labels, columns) in fields.items():
+            field_probs[field] = probs[:, columns]
+            field_labels[field] = labels
+            field_evidence[field] = [ev.select(columns) for ev in evidence]
+    for cache in caches.values():
+        print(f"Token cache {cache.root}: {cache.hits} hits, {cache.misses} tokenized")
+    return field_probs, field_labels, field_evidence
+
+
+def make_card(
+    rec: dict,
+    i: int,
+    field_probs: Dict[str, np.ndarray],
+    field_labels: Dict[str, List[str]],
+    field_evidence: Dict[str, List[SentenceEvidence]],
+    threshold: float,
+    k: int = 3,
+) -> dict:
+    """Prediction card for row i of score_fields output (one predict.py output line)."""
+    out = {"incident_id": rec.get("incident_id"), "pred": {}, "confidence": {}, "evidence": {}}
+    sentences = split_sentences(rec["text"])
+    for field, probs in field_probs.items():
+        labels = field_labels[field]
+        picked = [lab for lab, p in zip(labels, probs[i]) if p >= threshold]
+        conf = {lab: float(p) for lab, p in zip(labels, probs[i]) if lab in picked}
+
+        out["pred"][field] = picked
+        out["confidence"][field] = conf
+        evidence = field_evidence[field][i]
+        out["evidence"][field] = {
+            lab: [sentences[s] for s in evidence.top(j, k)] for j, lab in enumerate(labels) if lab in picked
+        }
     return out
 
 
+def write_predictions(records: List[dict], out_path: Path, args: argparse.Namespace) -> float:
+    """Score records and write one card per line; returns the seconds spent (model loading included)."""
+    label_space = yaml.safe_load(Path(args.schema).read_text(encoding="utf-8"))["labels"]
+    model_root = Path(args.model_dir)
+    texts = [rec["text"] for rec in records]
+    start = time.perf_counter()
+    field_probs, field_labels, field_evidence = score_fields(
+        iter_scorers(model_root, label_space, args.backend, args.threads),
+        texts,
+        args.max_length,
+        args.batch_size,
+        args.pooling,
+        args.stride,
+        args.token_cache,
+        args.embedding_cache,
+    )
+    seconds = time.perf_counter() - start
+
+    if args.parity_check and args.backend != "torch":
+        ref_probs, _, _ = score_fields(
+            iter_scorers(model_root, label_space, "torch"),
+            texts,
+            args.max_length,
+            args.batch_size,
+            args.pooling,
+            args.stride,
+        )
+        for field, probs in field_probs.items():
+            dev = float(np.abs(probs - ref_probs[field]).max()) if probs.size else 0.0
+            print(f"Parity {args.backend} vs torch [{field}]: max |dp| = {dev:.2e}")
+
+    with out_path.open("w", encoding="utf-8") as f:
+        for i, rec in enumerate(records):
+            out = make_card(rec, i, field_probs, field_labels, field_evidence, args.threshold)
+            f.write(json.dumps(out, ensure_ascii=False) + "\n")
+    return seconds
+
+
+def _predict_shard(job: Tuple[argparse.Namespace, int, int, int, str]) -> dict:
+    """Worker process: score non-empty lines [start, stop) of args.data into its shard file."""
+    args, shard, start, stop, out_path = job
+    torch.set_num_threads(args.threads)
+    with Path(args.data).open(encoding="utf-8") as f:
+        records = [json.loads(l) for l in islice((l for l in f if l.strip()), start, stop)]
+    seconds = write_predictions(records, Path(out_path), args)
+    return {"shard": shard, "docs": len(records), "seconds": seconds}
+
+
+def run_sharded(args: argparse.Namespace, pred_out: Path) -> None:
+    """Split the input into --workers contiguous shards, score them in parallel
+    processes with --threads intra-op threads each, and merge in input order."""
+    with Path(args.data).open(encoding="utf-8") as f:
+        n = sum(1 for l in f if l.strip())
+    workers = max(1, min(args.workers, n))
+    threads = args.threads or max(1, (os.cpu_count() or 1) // workers)
+    bounds = np.linspace(0, n, workers + 1).astype(int)
+    shard_paths = [pred_out.with_name(f"{pred_out.name}.shard-{k:03d}") for k in range(workers)]
+    shard_args = argparse.Namespace(**{**vars(args), "threads": threads})
+    jobs = [(shard_args, k, int(bounds[k]), int(bounds[k + 1]), str(shard_paths[k])) for k in range(workers)]
+
+    start = time.perf_counter()
+    # spawn: forked children would inherit the parent's torch thread pools
+    with ProcessPoolExecutor(workers, mp_context=mp.get_context("spawn")) as ex:
+        stats = list(ex.map(_predict_shard, jobs))
+    wall = time.perf_counter() - start
+
+    with pred_out.open("wb") as out:
+        for path in shard_paths:
+            with path.open("rb") as f:
+                shutil.copyfileobj(f, out)
+            path.unlink()
+
+    for st in stats:
+        rate = st["docs"] / st["seconds"] if st["seconds"] else 0.0
+        print(f"Worker {st['shard']}: {st['docs']} docs in {st['seconds']:.2f}s ({rate:.1f} docs/s incl. model load)")
+    print(f"Scored {n} records with {workers} workers x {threads} threads in {wall:.2f}s ({n / wall:.1f} docs/s)")
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--data", required=True, help="JSONL incidents")
     ap.add_argument("--schema", default="data/schema.yaml")
-    ap.add_argument("--model_dir", required=True, help="Root output_dir from train script (contains per-field folders)")
+    ap.add_argument(
+        "--model_dir",
+        required=True,
+        help="Root output_dir from train script (per-field folders, or multitask/ for a shared encoder)",
+    )
     ap.add_argument("--out", required=True)
     ap.add_argument("--threshold", type=float, default=0.5)
     ap.add_argument("--max_length", type=int, default=512)
+    ap.add_argument("--batch_size", type=int, default=16, help="Records per forward pass (length-bucketed)")
+    ap.add_argument(
+        "--pooling",
+        choices=["max", "mean", "truncate"],
+        default="max",
+        help="Pool logits over sliding windows (max/mean), or truncate at --max_length",
+    )
+    ap.add_argument("--stride", type=int, default=128, help="Token overlap between consecutive windows")
+    ap.add_argument("--token_cache", default=None, help="Token id cache dir shared with training (token_cache.py)")
+    ap.add_argument(
+        "--embedding_cache",
+        default=None,
+        help="Frozen-encoder embedding cache dir (default: the one the frozen heads were trained with)",
+    )
+    ap.add_argument(
+        "--backend",
+        choices=["torch", "onnx", "onnx-int8"],
+        default="torch",
+        help="onnx backends need `python -m src.models.onnx_export` first",
+    )
+    ap.add_argument(
+        "--parity_check",
+        action="store_true",
+        help="With an onnx backend, also run torch and report the largest probability deviation",
+    )
+    ap.add_argument("--workers", type=int, default=1, help="Worker processes, each scoring a contiguous shard")
+    ap.add_argument(
+        "--threads",
+        type=int,
+        default=0,
+        help="Intra-op threads per process (0: library default; cpu_count // workers when sharded)",
+    )
     args = ap.parse_args()
 
-    schema = yaml.safe_load(Path(args.schema).read_text(encoding="utf-8"))
-    label_space = schema["labels"]
-
-    records = [json.loads(l) for l in Path(args.data).read_text(encoding="utf-8").splitlines() if l.strip()]
-    model_root = Path(args.model_dir)
-
     pred_out = Path(args.out)
     pred_out.parent.mkdir(parents=True, exist_ok=True)
 
-    # load per-field models
-    models = {}
-    tokenizers = {}
-    for field in ["subsystem", "failure_mode", "impact", "cause"]:
-        path = model_root / field / "best"
-        if path.exists():
-            models[field] = AutoModelForSequenceClassification.from_pretrained(str(path))
-            tokenizers[field] = AutoTokenizer.from_pretrained(str(path))
-            models[field].eval()
-
-    with pred_out.open("w", encoding="utf-8") as f:
-        for rec in records:
-            out = {"incident_id": rec["incident_id"], "pred": {}, "confidence": {}, "evidence": {}}
-            text = rec["text"]
-
-            for field, model in models.items():
-                tokenizer = tokenizers[field]
-                enc = tokenizer(text, truncation=True, max_length=args.max_length, return_tensors="pt")
-                with torch.no_grad():
-                    logits = model(**enc).logits.squeeze(0).cpu().numpy()
-                probs = 1 / (1 + np.exp(-logits))
-                labels = label_space[field]
-                picked = [lab for lab, p in zip(labels, probs) if p >= args.threshold]
-                conf = {lab: float(p) for lab, p in zip(labels, probs) if lab in picked}
-
-                out["pred"][field] = picked
-                out["confidence"][field] = conf
-                out["evidence"][field] = pick_evidence(text, picked)
-
-            f.write(json.dumps(out, ensure_ascii=False) + "\n")
+    if args.workers > 1:
+        if args.parity_check:
+            raise ValueError("--parity_check runs in a single process; drop --workers.")
+        if (Path(args.model_dir) / "frozen" / "best" / "frozen.json").exists():
+            # the embedding cache has a single writer
+            raise ValueError("Frozen heads score from the embedding cache in one process; drop --workers.")
+        run_sharded(args, pred_out)
+    else:
+        if args.threads:
+            torch.set_num_threads(args.threads)
+        records = [json.loads(l) for l in Path(args.data).read_text(encoding="utf-8").splitlines() if l.strip()]
+        seconds = write_predictions(records, pred_out, args)
+        print(f"Scored {len(records)} records with backend={args.backend} in {seconds:.2f}s")
 
     print(f"Wrote predictions -> {pred_out}")
 
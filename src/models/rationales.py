@@ -0,0 +1,131 @@
+"""
+rationales.py
+-------------
+Evidence sentences scored from the classifier's own forward pass.
+
+The encoder runs once; predictions are the model's own logits, and the
+classification head (pooler + classifier) is also applied to the final hidden
+state of every token. The rows are per-token label logits, and a sentence's
+score for a label is the mean token logit over the sentence. No second
+forward pass is needed. For heads with extra layers (e.g. DistilBERT's
+pre_classifier) the per-token head is an approximation used for evidence only,
+and a warning is printed once. Evidence for a predicted label is the
+top-scoring sentences of the window that drove its pooled logit.
+
+The extra work is the head applied to every token (for BERT/DeBERTa heads one
+hidden x hidden projection), small next to the encoder itself.
+"""
+
+import warnings
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+from torch import nn
+
+from src.models.multitask import MultiTaskClassifier
+
+
+def backbone(model: nn.Module) -> nn.Module:
+    """Module whose first output is the final hidden state."""
+    return model.encoder if isinstance(model, MultiTaskClassifier) else model.base_model
+
+
+def token_logits(model: nn.Module, hidden: torch.Tensor) -> torch.Tensor:
+    """(batch x tokens x labels) logits of the head applied to every token state."""
+    if isinstance(model, MultiTaskClassifier):
+        return model.token_logits(hidden)
+    batch, tokens, width = hidden.shape
+    # poolers and heads read position 0: present each token as its own length-1 sequence
+    x = hidden.reshape(batch * tokens, 1, width)
+    pooler = getattr(model, "pooler", None)
+    if pooler is None:
+        pooler = getattr(model.base_model, "pooler", None)
+    if pooler is not None:
+        x = pooler(x)
+    return model.classifier(x).reshape(batch, tokens, -1)
+
+
+_checked_heads = set()
+
+
+def forward_with_token_logits(model, batch: dict) -> Tuple[torch.Tensor, torch.Tensor]:
+    """One forward pass returning (logits, token logits).
+
+    Logits are always the model's own output; token logits only rank evidence.
+    """
+    if not isinstance(model, nn.Module):
+        # ONNX Runtime sessions export token logits as a second graph output
+        return model.run_with_token_logits(batch)
+    if isinstance(model, MultiTaskClassifier):
+        # linear heads on the first token: position 0 is exactly the model's logits
+        scores = token_logits(model, backbone(model)(**batch)[0])
+        return scores[:, 0], scores
+    out = model(**batch, output_hidden_states=True)
+    scores = token_logits(model, out.hidden_states[-1])
+    if id(model) not in _checked_heads:
+        _checked_heads.add(id(model))
+        if not torch.allclose(scores[:, 0], out.logits, atol=1e-4):
+            warnings.warn(
+                f"{type(model).__name__}: the per-token head does not reproduce the model's logits; "
+                "evidence sentences are ranked with an approximate head (predictions are unaffected)."
+            )
+    return out.logits, scores
+
+
+def window_sentence_scores(
+    scores: np.ndarray, offsets: Sequence[Tuple[int, int]], spans: Sequence[Tuple[int, int]]
+) -> Tuple[int, np.ndarray]:
+    """Mean token score per sentence for one window.
+
+    Returns (first sentence index, (n_covered x labels) scores) for the
+    contiguous run of sentences the window's tokens fall into; sentences in
+    that run without tokens get NaN.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
+    keep = offsets[:, 1] > offsets[:, 0]  # special and padding tokens have empty offsets
+    if not spans or not keep.any():
+        return 0, np.zeros((0, scores.shape[1]), dtype=np.float32)
+    starts = np.asarray([a for a, _ in spans], dtype=np.int64)
+    ends = np.asarray([b for _, b in spans], dtype=np.int64)
+    sent = np.searchsorted(starts, offsets[keep, 0], side="right") - 1
+    inside = (sent >= 0) & (offsets[keep, 0] < ends[np.maximum(sent, 0)])
+    if not inside.any():
+        return 0, np.zeros((0, scores.shape[1]), dtype=np.float32)
+    sent = sent[inside]
+    token_scores = scores[keep][inside]
+
+    lo, hi = int(sent.min()), int(sent.max()) + 1
+    sums = np.zeros((hi - lo, scores.shape[1]), dtype=np.float64)
+    np.add.at(sums, sent - lo, token_scores)
+    counts = np.bincount(sent - lo, minlength=hi - lo)[:, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = (sums / counts).astype(np.float32)
+    return lo, means
+
+
+class SentenceEvidence:
+    """Sentence scores of one document, per label from the window that drove it."""
+
+    def __init__(
+        self,
+        windows: List[Tuple[int, np.ndarray]],
+        driver: np.ndarray,
+        columns: Optional[np.ndarray] = None,
+    ):
+        self.windows = windows
+        self.driver = driver
+        self.columns = np.arange(len(driver)) if columns is None else columns
+
+    def select(self, columns) -> "SentenceEvidence":
+        """Evidence restricted to a subset of label columns (e.g. one field of a multitask model)."""
+        return SentenceEvidence(self.windows, self.driver[columns], self.columns[columns])
+
+    def top(self, j: int, k: int = 3) -> List[int]:
+        """Indices of the k highest-scoring sentences for label column j."""
+        if not self.windows:
+            return []
+        lo, scores = self.windows[self.driver[j]]
+        col = scores[:, self.columns[j]]
+        ranked = [int(s) for s in np.argsort(-col, kind="stable") if not np.isnan(col[s])]
+        return [lo + s for s in ranked[:k]]
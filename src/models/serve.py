@@ -0,0 +1,227 @@
+"""
+serve.py
+--------
+Long-running local inference server. Checkpoints are loaded once; concurrent
+requests are gathered into micro-batches and scored together.
+
+Run:
+  python -m src.models.serve --model_dir outputs/deberta_multilabel --port 8765
+
+  curl -s localhost:8765/predict -d '{"incident_id": "x", "text": "..."}'
+
+Endpoints:
+  POST /predict   one record or a list of records ({"incident_id", "text"});
+                  returns the card JSON predict.py writes per line (a list for a list)
+  GET  /health    loaded fields, batch settings and request counters
+
+A batch is flushed when it holds --max_batch records or --max_wait_ms after
+its first record arrived, whichever comes first. Scoring runs in a worker
+thread, so requests arriving meanwhile queue up for the next batch.
+Connections are kept alive, so batch jobs can reuse one connection.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+import yaml
+
+from src.models.predict import iter_scorers, make_card, score_fields
+
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class MicroBatcher:
+    """Queue records from concurrent requests and score them in batches."""
+
+    def __init__(self, score: Callable[[List[dict]], List[dict]], max_batch: int = 32, max_wait: float = 0.01):
+        if max_batch < 1:
+            raise ValueError(f"max_batch must be >= 1, got {max_batch}")
+        self.score = score
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue: "asyncio.Queue[Tuple[List[dict], asyncio.Future]]" = asyncio.Queue()
+        self.batches = 0
+        self.records = 0
+
+    async def submit(self, records: List[dict]) -> List[dict]:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((records, future))
+        return await future
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            size = len(pending[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            records = [rec for recs, _ in pending for rec in recs]
+            try:
+                cards = await loop.run_in_executor(None, self.score, records)
+            except Exception as exc:  # report to every waiting request, keep serving
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            self.batches += 1
+            self.records += len(records)
+            start = 0
+            for recs, future in pending:
+                if not future.done():
+                    future.set_result(cards[start : start + len(recs)])
+                start += len(recs)
+
+
+def parse_records(body: bytes) -> Tuple[List[dict], bool]:
+    """Return (records, was_list); raises ValueError on malformed input."""
+    try:
+        payload = json.loads(body or b"null")
+    except json.JSONDecodeError as exc:
+        raise ValueError(f"Invalid JSON: {exc}") from exc
+    single = isinstance(payload, dict)
+    records = [payload] if single else payload
+    if not isinstance(records, list):
+        raise ValueError("Expected a record object or a list of records.")
+    for rec in records:
+        if not isinstance(rec, dict) or not isinstance(rec.get("text"), str):
+            raise ValueError('Every record needs a string "text" field.')
+    return records, not single
+
+
+async def read_request(reader: asyncio.StreamReader):
+    """Parse one HTTP/1.1 request; returns None when the client closed the connection."""
+    line = await reader.readline()
+    if not line:
+        return None
+    method, path, version = line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    body = await reader.readexactly(length) if length else b""
+    keep_alive = headers.get("connection", "").lower() != "close" and version.strip() == "HTTP/1.1"
+    return method, path.split("?", 1)[0], body, keep_alive
+
+
+def write_response(writer: asyncio.StreamWriter, status: int, payload, keep_alive: bool) -> None:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+
+
+def make_handler(batcher: MicroBatcher, info: dict):
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError):
+                    write_response(writer, 400, {"error": "Malformed HTTP request."}, False)
+                    break
+                if request is None:
+                    break
+                method, path, body, keep_alive = request
+
+                if path == "/health" and method == "GET":
+                    status, payload = 200, {**info, "batches": batcher.batches, "records": batcher.records}
+                elif path == "/predict" and method == "POST":
+                    try:
+                        records, was_list = parse_records(body)
+                        cards = await batcher.submit(records) if records else []
+                        status, payload = 200, cards if was_list else cards[0]
+                    except ValueError as exc:
+                        status, payload = 400, {"error": str(exc)}
+                    except Exception as exc:
+                        status, payload = 500, {"error": f"{type(exc).__name__}: {exc}"}
+                elif path in ("/health", "/predict"):
+                    status, payload = 405, {"error": f"{method} not allowed on {path}"}
+                else:
+                    status, payload = 404, {"error": f"Unknown path {path}"}
+
+                write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return handle
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model_dir", default="outputs/deberta_multilabel")
+    ap.add_argument("--schema", default="data/schema.yaml")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--threshold", type=float, default=0.5)
+    ap.add_argument("--max_length", type=int, default=512)
+    ap.add_argument("--stride", type=int, default=128)
+    ap.add_argument("--pooling", choices=["max", "mean", "truncate"], default="max")
+    ap.add_argument("--backend", choices=["torch", "onnx", "onnx-int8"], default="torch")
+    ap.add_argument("--max_batch", type=int, default=32, help="Flush a micro-batch at this many records")
+    ap.add_argument("--max_wait_ms", type=float, default=10.0, help="Flush a micro-batch this long after its first record")
+    args = ap.parse_args()
+
+    schema = yaml.safe_load(Path(args.schema).read_text(encoding="utf-8"))
+    start = time.perf_counter()
+    scorers = list(iter_scorers(Path(args.model_dir), schema["labels"], args.backend))
+    if not scorers:
+        raise ValueError(f"No checkpoints found under {args.model_dir}")
+    fields = [field for _, _, field_map in scorers for field in field_map]
+    print(f"Loaded {', '.join(fields)} ({args.backend}) in {time.perf_counter() - start:.1f}s")
+
+    def score(records: List[dict]) -> List[dict]:
+        texts = [rec["text"] for rec in records]
+        field_probs, field_labels, field_evidence = score_fields(
+            scorers, texts, args.max_length, args.max_batch, args.pooling, args.stride
+        )
+        return [make_card(rec, i, field_probs, field_labels, field_evidence, args.threshold) for i, rec in enumerate(records)]
+
+    info = {"fields": fields, "backend": args.backend, "max_batch": args.max_batch, "max_wait_ms": args.max_wait_ms}
+
+    async def serve() -> None:
+        batcher = MicroBatcher(score, args.max_batch, args.max_wait_ms / 1000)
+        worker = asyncio.create_task(batcher.run())
+        server = await asyncio.start_server(make_handler(batcher, info), args.host, args.port)
+        print(f"Serving on http://{args.host}:{args.port} (POST /predict, GET /health)")
+        async with server:
+            try:
+                await server.serve_forever()
+            finally:
+                worker.cancel()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
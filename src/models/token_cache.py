@@ -0,0 +1,167 @@
+"""
+token_cache.py
+--------------
+Content-addressed on-disk cache of token ids, shared by training and prediction.
+
+Entries are keyed by a hash of the text inside a directory per tokenizer
+fingerprint (hash of the serialized tokenizer plus the `tokenizers` version),
+so a fine-tuned checkpoint that saved the same tokenizer reuses the entries
+written while training it.
+
+Each entry holds the full token sequence (no special tokens, no truncation)
+with character offsets. One entry therefore serves every --max_length: the
+truncated encodings used for training and the sliding windows used by
+predict.py are cut from it at read time and match what the tokenizer would
+return for the same arguments.
+
+Layout:
+  <cache_dir>/<fingerprint>/*.arrow   Arrow IPC shards (text_hash, input_ids, offsets)
+
+Shards are memory-mapped on open; texts not seen before are tokenized once and
+appended as a new shard, so re-running on a mostly unchanged corpus tokenizes
+only the new texts.
+"""
+
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import tokenizers
+
+
+def text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    """Hash of the tokenizer's vocabulary, normalizer and special-token rules.
+
+    The runtime truncation/padding state is excluded: it changes with every
+    call and does not affect the cached (untruncated) ids.
+    """
+    spec = json.loads(tokenizer.backend_tokenizer.to_str())
+    spec.pop("truncation", None)
+    spec.pop("padding", None)
+    payload = json.dumps({"tokenizer": spec, "tokenizers": tokenizers.__version__}, sort_keys=True)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=12).hexdigest()
+
+
+class TokenCache:
+    """Memory-mapped text -> token ids store for one (fast) tokenizer."""
+
+    def __init__(self, cache_dir: Path, tokenizer):
+        if not getattr(tokenizer, "is_fast", False):
+            raise ValueError("TokenCache needs a fast tokenizer (character offsets are cached).")
+        self.tokenizer = tokenizer
+        self.root = Path(cache_dir) / tokenizer_fingerprint(tokenizer)
+        self.hits = 0
+        self.misses = 0
+        # per record batch: (row starts, flat ids, flat offsets)
+        self._batches: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        self._index: Dict[str, Tuple[int, int]] = {}
+        for path in sorted(self.root.glob("*.arrow")):
+            self._load(path)
+
+    def _load(self, path: Path) -> None:
+        reader = pa.ipc.open_file(pa.memory_map(str(path)))
+        for b in range(reader.num_record_batches):
+            batch = reader.get_batch(b)
+            ids = batch.column("input_ids")
+            k = len(self._batches)
+            self._batches.append(
+                (ids.offsets.to_numpy(), ids.values.to_numpy(), batch.column("offsets").values.to_numpy())
+            )
+            for row, h in enumerate(batch.column("text_hash").to_pylist()):
+                self._index[h] = (k, row)
+
+    def _append(self, hashes: List[str], texts: List[str]) -> None:
+        enc = self.tokenizer(
+            texts,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+            verbose=False,
+        )
+        batch = pa.record_batch(
+            {
+                "text_hash": pa.array(hashes, pa.string()),
+                "input_ids": pa.array(enc["input_ids"], pa.list_(pa.int32())),
+                "offsets": pa.array(
+                    [[x for pair in offs for x in pair] for offs in enc["offset_mapping"]], pa.list_(pa.int32())
+                ),
+            }
+        )
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.root / f"{uuid.uuid4().hex}.arrow"
+        tmp = path.with_suffix(".tmp")
+        with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+        # readers only glob *.arrow, so a shard appears complete or not at all
+        os.replace(tmp, path)
+        self._load(path)
+
+    def tokens(self, texts: Sequence[str]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """(token ids, (n_tokens x 2) char offsets) per text, without special tokens."""
+        hashes = [text_hash(t) for t in texts]
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in self._index:
+                missing.setdefault(h, t)
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+        if missing:
+            self._append(list(missing), list(missing.values()))
+
+        out = []
+        for h in hashes:
+            k, row = self._index[h]
+            starts, ids, offsets = self._batches[k]
+            a, b = starts[row], starts[row + 1]
+            out.append((ids[a:b], offsets[2 * a : 2 * b].reshape(-1, 2)))
+        return out
+
+    def _with_special_tokens(self, ids: List[int]) -> Dict[str, List[int]]:
+        tok = self.tokenizer
+        row = {"input_ids": tok.build_inputs_with_special_tokens(ids)}
+        if "token_type_ids" in tok.model_input_names:
+            row["token_type_ids"] = tok.create_token_type_ids_from_sequences(ids)
+        row["attention_mask"] = [1] * len(row["input_ids"])
+        return row
+
+    def encode(self, texts: Sequence[str], max_length: int) -> Dict[str, List[List[int]]]:
+        """Same as tokenizer(texts, truncation=True, max_length=max_length)."""
+        room = max_length - self.tokenizer.num_special_tokens_to_add()
+        rows = [self._with_special_tokens(ids[:room].tolist()) for ids, _ in self.tokens(texts)]
+        keys = list(self._with_special_tokens([]))
+        return {k: [r[k] for r in rows] for k in keys}
+
+    def encode_windows(self, texts: Sequence[str], max_length: int, stride: int) -> Dict[str, list]:
+        """Same as tokenizer(texts, truncation=True, max_length=max_length, stride=stride,
+        return_overflowing_tokens=True, return_offsets_mapping=True)."""
+        room = max_length - self.tokenizer.num_special_tokens_to_add()
+        if not 0 <= stride < room:
+            raise ValueError(f"stride must be in [0, {room}) for max_length={max_length}, got {stride}.")
+        keys = list(self._with_special_tokens([]))
+        enc = {k: [] for k in keys + ["offset_mapping", "overflow_to_sample_mapping"]}
+        for doc, (ids, offsets) in enumerate(self.tokens(texts)):
+            start = 0
+            while True:
+                window = ids[start : start + room].tolist()
+                row = self._with_special_tokens(window)
+                # content positions in the built sequence (special-token ids are never negative)
+                layout = self.tokenizer.build_inputs_with_special_tokens([-1] * len(window))
+                content = iter(offsets[start : start + room].tolist())
+                for k in keys:
+                    enc[k].append(row[k])
+                enc["offset_mapping"].append([tuple(next(content)) if t == -1 else (0, 0) for t in layout])
+                enc["overflow_to_sample_mapping"].append(doc)
+                if start + room >= len(ids):
+                    break
+                start += room - stride
+        return enc
@@ -5,6 +5,21 @@ Fine-tune a transformer encoder (default: DeBERTa) for multi-label classificatio
 
 This script supports training per-field heads by training a separate model per task field.
 For small datasets, this is simpler and often more stable than a multi-head architecture.
+With --multitask it instead trains one shared encoder with a head per field
+(see src/models/multitask.py), so inference runs the encoder once per document.
+With --frozen the encoder is not trained at all: mean-pooled embeddings are
+cached on disk (src/models/frozen.py) and linear heads per field are fitted
+on them in seconds, for quick iteration on labels and thresholds.
+
+Batches are padded dynamically to their longest member. For faster CPU runs,
+--group_by_length batches similar lengths together, --grad_accum keeps a large
+effective batch with small per-step memory, and --bf16 enables bf16 autocast.
+Per-epoch samples/sec and tokens/sec are printed and saved to throughput.json.
+
+Checkpoints: only the best --save_total_limit epoch checkpoints are kept,
+--early_stopping_patience stops after N evaluations without a micro_f1 gain,
+and --save_weights_only skips optimizer/scheduler/RNG state. Bytes written
+and seconds spent saving/loading checkpoints are printed after each run.
 
 Example:
   python -m src.models.train_multilabel_deberta \
@@ -16,8 +31,9 @@ Example:
 
 import argparse
 import json
+import time
 from pathlib import Path
-from typing import Dict, List
+from typing import Callable, Dict, List
 
 import numpy as np
 import yaml
@@ -25,11 +41,18 @@ from datasets import Dataset
 from transformers import (
     AutoTokenizer,
     AutoModelForSequenceClassification,
+    DataCollatorWithPadding,
+    EarlyStoppingCallback,
     TrainingArguments,
     Trainer,
+    TrainerCallback,
 )
 import torch
 
+from src.models.frozen import FrozenHeadClassifier, train_head
+from src.models.multitask import MultiTaskClassifier
+from src.models.token_cache import TokenCache
+
 
 def load_jsonl(path: str) -> List[Dict]:
     return [json.loads(l) for l in Path(path).read_text(encoding="utf-8").splitlines() if l.strip()]
@@ -51,6 +74,19 @@ def make_dataset(records: List[Dict], field: str, label_list: List[str]) -> Data
     return Dataset.from_dict({"text": texts, "labels": Y})
 
 
+def make_multitask_dataset(records: List[Dict], field_labels: Dict[str, List[str]]) -> Dataset:
+    """Targets of all fields concatenated in field order (matches MultiTaskClassifier logits)."""
+    texts = [r["text"] for r in records]
+    Y = []
+    for r in records:
+        row = []
+        for field, label_list in field_labels.items():
+            labs = set(r.get("labels", {}).get(field, []))
+            row.extend(1.0 if lab in labs else 0.0 for lab in label_list)
+        Y.append(row)
+    return Dataset.from_dict({"text": texts, "labels": Y})
+
+
 def compute_metrics(eval_pred):
     logits, labels = eval_pred
     probs = 1 / (1 + np.exp(-logits))
@@ -66,7 +102,103 @@ def compute_metrics(eval_pred):
     return {"micro_f1": float(f1), "precision": float(precision), "recall": float(recall)}
 
 
+class ThroughputCallback(TrainerCallback):
+    """Per-epoch training throughput: samples/sec, (non-padding) tokens/sec and padding share.
+
+    Counts come from MultiLabelTrainer.training_step; evaluation time is not
+    included. The log is written to <output_dir>/throughput.json.
+    """
+
+    def __init__(self):
+        self.samples = 0
+        self.tokens = 0
+        self.padded = 0
+        self.start = 0.0
+        self.epochs: List[dict] = []
+
+    def count(self, inputs: dict) -> None:
+        mask = inputs.get("attention_mask")
+        self.samples += len(inputs["input_ids"])
+        self.padded += inputs["input_ids"].numel()
+        self.tokens += int(mask.sum()) if mask is not None else inputs["input_ids"].numel()
+
+    def on_epoch_begin(self, args, state, control, **kwargs):
+        self.samples = 0
+        self.tokens = 0
+        self.padded = 0
+        self.start = time.perf_counter()
+
+    def on_epoch_end(self, args, state, control, **kwargs):
+        seconds = time.perf_counter() - self.start
+        entry = {
+            "epoch": len(self.epochs) + 1,
+            "seconds": round(seconds, 3),
+            "samples_per_sec": round(self.samples / seconds, 2) if seconds else 0.0,
+            "tokens_per_sec": round(self.tokens / seconds, 1) if seconds else 0.0,
+            "padding_pct": round(100 * (1 - self.tokens / self.padded), 1) if self.padded else 0.0,
+        }
+        self.epochs.append(entry)
+        print(
+            f"Epoch {entry['epoch']}: {entry['samples_per_sec']:.1f} samples/s, "
+            f"{entry['tokens_per_sec']:.0f} tokens/s, {entry['padding_pct']:.0f}% padding ({entry['seconds']:.1f}s)"
+        )
+
+    def on_train_end(self, args, state, control, **kwargs):
+        path = Path(args.output_dir) / "throughput.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.epochs, indent=2), encoding="utf-8")
+
+
+def dir_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in Path(path).rglob("*") if p.is_file())
+
+
 class MultiLabelTrainer(Trainer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.throughput = ThroughputCallback()
+        self.add_callback(self.throughput)
+        self.io = {"checkpoints": 0, "bytes_written": 0, "write_seconds": 0.0, "read_seconds": 0.0}
+        self._saved_step = None
+
+    def training_step(self, model, inputs, *args, **kwargs):
+        self.throughput.count(inputs)
+        return super().training_step(model, inputs, *args, **kwargs)
+
+    def _save_checkpoint(self, model, trial, *args, **kwargs):
+        # includes pruning of checkpoints beyond save_total_limit
+        start = time.perf_counter()
+        super()._save_checkpoint(model, trial, *args, **kwargs)
+        self.io["write_seconds"] += time.perf_counter() - start
+        if self.state.global_step == self._saved_step:
+            # the last step is saved when training stops and again, with metrics, at the
+            # epoch end; both calls must run, but the checkpoint is counted once
+            return
+        self._saved_step = self.state.global_step
+        self.io["checkpoints"] += 1
+        self.io["bytes_written"] += dir_bytes(Path(self.args.output_dir) / f"checkpoint-{self.state.global_step}")
+
+    def _load_best_model(self):
+        start = time.perf_counter()
+        super()._load_best_model()
+        self.io["read_seconds"] += time.perf_counter() - start
+
+    def save_final(self, save: Callable[[], None], path: Path) -> None:
+        """Run save() (writing the final model to path) and count it in the I/O summary."""
+        start = time.perf_counter()
+        save()
+        self.io["write_seconds"] += time.perf_counter() - start
+        self.io["bytes_written"] += dir_bytes(path)
+
+    def report_io(self) -> None:
+        io = self.io
+        kept = list(Path(self.args.output_dir).glob("checkpoint-*"))
+        print(
+            f"Checkpoint I/O: {io['checkpoints']} checkpoint saves + final model, {io['bytes_written'] / 1e6:.1f} MB written "
+            f"in {io['write_seconds']:.1f}s, best-model reload {io['read_seconds']:.1f}s; "
+            f"{len(kept)} checkpoints ({sum(dir_bytes(p) for p in kept) / 1e6:.1f} MB) left on disk"
+        )
+
     def compute_loss(self, model, inputs, return_outputs=False):
         labels = inputs.pop("labels")
         outputs = model(**inputs)
@@ -76,6 +208,80 @@ class MultiLabelTrainer(Trainer):
         return (loss, outputs) if return_outputs else loss
 
 
+def add_speed_args(ap: argparse.ArgumentParser) -> None:
+    """Training-throughput flags shared by the training entry points."""
+    ap.add_argument(
+        "--group_by_length",
+        action="store_true",
+        help="Batch similar-length texts together so dynamic padding wastes fewer tokens",
+    )
+    ap.add_argument("--grad_accum", type=int, default=1, help="Gradient accumulation steps (effective batch = batch_size x N)")
+    ap.add_argument("--bf16", action="store_true", help="bf16 autocast (CPU or GPU)")
+    ap.add_argument("--pad_to_multiple_of", type=int, default=None, help="Round padded batch lengths up (e.g. 8)")
+
+
+def add_checkpoint_args(ap: argparse.ArgumentParser) -> None:
+    """Checkpoint retention flags shared by the training entry points."""
+    ap.add_argument(
+        "--save_total_limit",
+        type=int,
+        default=1,
+        help="Epoch checkpoints kept on disk; the best one is always kept (0: keep all)",
+    )
+    ap.add_argument(
+        "--early_stopping_patience",
+        type=int,
+        default=0,
+        help="Stop after N evaluations without a micro_f1 improvement (0: off)",
+    )
+    ap.add_argument(
+        "--save_weights_only",
+        action="store_true",
+        help="Checkpoints hold model weights only (no optimizer/scheduler/RNG state; not resumable)",
+    )
+
+
+def training_args(args: argparse.Namespace, out_dir: Path) -> TrainingArguments:
+    if args.save_total_limit < 0 or args.early_stopping_patience < 0:
+        raise ValueError("--save_total_limit and --early_stopping_patience must be >= 0")
+    return TrainingArguments(
+        output_dir=str(out_dir),
+        learning_rate=args.lr,
+        per_device_train_batch_size=args.batch_size,
+        per_device_eval_batch_size=args.batch_size,
+        gradient_accumulation_steps=args.grad_accum,
+        group_by_length=args.group_by_length,
+        bf16=args.bf16,
+        num_train_epochs=args.epochs,
+        evaluation_strategy="epoch",
+        save_strategy="epoch",
+        save_total_limit=args.save_total_limit or None,
+        save_only_model=args.save_weights_only,
+        logging_steps=10,
+        load_best_model_at_end=True,
+        metric_for_best_model="micro_f1",
+        greater_is_better=True,
+        report_to=[],
+    )
+
+
+def build_trainer(args: argparse.Namespace, model, tokenizer, out_dir: Path, train_ds, eval_ds) -> MultiLabelTrainer:
+    """Trainer with per-batch dynamic padding, the shared training arguments and early stopping."""
+    callbacks = []
+    if args.early_stopping_patience:
+        callbacks.append(EarlyStoppingCallback(early_stopping_patience=args.early_stopping_patience))
+    return MultiLabelTrainer(
+        model=model,
+        args=training_args(args, out_dir),
+        train_dataset=train_ds,
+        eval_dataset=eval_ds,
+        tokenizer=tokenizer,
+        data_collator=DataCollatorWithPadding(tokenizer, pad_to_multiple_of=args.pad_to_multiple_of),
+        compute_metrics=compute_metrics,
+        callbacks=callbacks,
+    )
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--data", required=True)
@@ -87,6 +293,30 @@ def main():
     ap.add_argument("--batch_size", type=int, default=4)
     ap.add_argument("--lr", type=float, default=2e-5)
     ap.add_argument("--max_length", type=int, default=512)
+    ap.add_argument(
+        "--multitask",
+        action="store_true",
+        help="Train one shared encoder with a head per --task field (saved under multitask/)",
+    )
+    ap.add_argument(
+        "--token_cache",
+        default=None,
+        help="Directory for cached token ids (shared across fields, runs and predict.py --token_cache)",
+    )
+    ap.add_argument(
+        "--frozen",
+        action="store_true",
+        help="Keep the encoder frozen and train only linear heads on cached embeddings (saved under frozen/)",
+    )
+    ap.add_argument(
+        "--embedding_cache",
+        default=None,
+        help="Embedding cache dir for --frozen (default: <output_dir>/embeddings; also read by predict.py)",
+    )
+    ap.add_argument("--head_epochs", type=int, default=300, help="Full-batch epochs per head with --frozen")
+    ap.add_argument("--head_lr", type=float, default=1e-2, help="Head learning rate with --frozen")
+    add_speed_args(ap)
+    add_checkpoint_args(ap)
     args = ap.parse_args()
 
     records = load_jsonl(args.data)
@@ -95,9 +325,19 @@ def main():
 
     tokenizer = AutoTokenizer.from_pretrained(args.model)
 
-    def tokenize(batch):
+    cache = TokenCache(args.token_cache, tokenizer) if args.token_cache else None
+
+    def tokenize_batch(batch):
         return tokenizer(batch["text"], truncation=True, max_length=args.max_length)
 
+    def tokenize(ds: Dataset) -> Dataset:
+        if cache is None:
+            return ds.map(tokenize_batch, batched=True)
+        misses = cache.misses
+        enc = cache.encode(ds["text"], args.max_length)
+        print(f"Token cache: {len(ds) - (cache.misses - misses)}/{len(ds)} texts reused")
+        return Dataset.from_dict({**ds.to_dict(), **enc})
+
     out_root = Path(args.output_dir)
     out_root.mkdir(parents=True, exist_ok=True)
 
@@ -111,9 +351,51 @@ def main():
         if field not in label_space:
             raise ValueError(f"Unknown field: {field}")
 
+    if args.frozen:
+        field_labels = {field: label_space[field] for field in args.task}
+        cache_dir = args.embedding_cache or str(out_root / "embeddings")
+        model = FrozenHeadClassifier(args.model, field_labels, args.max_length, cache_dir, args.batch_size)
+        start = time.perf_counter()
+        X_train = model.embed([r["text"] for r in train_records])
+        X_eval = model.embed([r["text"] for r in eval_records])
+        cache = model.cache()
+        print(
+            f"Embeddings: {cache.hits} cached, {cache.misses} encoded in {time.perf_counter() - start:.1f}s ({cache.root})"
+        )
+
+        for field, labels in field_labels.items():
+            start = time.perf_counter()
+            Y_train = np.asarray(make_dataset(train_records, field, labels)["labels"], dtype=np.float32)
+            Y_eval = np.asarray(make_dataset(eval_records, field, labels)["labels"], dtype=np.float32)
+            model.heads[field] = train_head(X_train, Y_train, args.head_epochs, args.head_lr)
+            logits = model.heads[field](torch.from_numpy(X_eval)).detach().numpy()
+            metrics = compute_metrics((logits, Y_eval))
+            print(f"{field}: head trained in {time.perf_counter() - start:.2f}s, eval micro_f1={metrics['micro_f1']:.3f}")
+
+        model.save(out_root / "frozen" / "best")
+        print(f"Saved frozen-encoder heads ({', '.join(field_labels)}) -> {out_root / 'frozen' / 'best'}")
+        return
+
+    if args.multitask:
+        field_labels = {field: label_space[field] for field in args.task}
+        train_ds = tokenize(make_multitask_dataset(train_records, field_labels))
+        eval_ds = tokenize(make_multitask_dataset(eval_records, field_labels))
+
+        model = MultiTaskClassifier.from_encoder(args.model, field_labels)
+        out_dir = out_root / "multitask"
+        trainer = build_trainer(args, model, tokenizer, out_dir, train_ds, eval_ds)
+
+        trainer.train()
+        best = out_dir / "best"
+        trainer.save_final(lambda: (model.save(best), tokenizer.save_pretrained(str(best))), best)
+        trainer.report_io()
+        print(f"Saved best multitask model ({', '.join(field_labels)}) -> {out_dir/'best'}")
+        return
+
+    for field in args.task:
         labels = label_space[field]
-        train_ds = make_dataset(train_records, field, labels).map(tokenize, batched=True)
-        eval_ds = make_dataset(eval_records, field, labels).map(tokenize, batched=True)
+        train_ds = tokenize(make_dataset(train_records, field, labels))
+        eval_ds = tokenize(make_dataset(eval_records, field, labels))
 
         model = AutoModelForSequenceClassification.from_pretrained(
             args.model,
@@ -122,32 +404,11 @@ def main():
         )
 
         out_dir = out_root / field
-        training_args = TrainingArguments(
-            output_dir=str(out_dir),
-            learning_rate=args.lr,
-            per_device_train_batch_size=args.batch_size,
-            per_device_eval_batch_size=args.batch_size,
-            num_train_epochs=args.epochs,
-            evaluation_strategy="epoch",
-            save_strategy="epoch",
-            logging_steps=10,
-            load_best_model_at_end=True,
-            metric_for_best_model="micro_f1",
-            greater_is_better=True,
-            report_to=[],
-        )
-
-        trainer = MultiLabelTrainer(
-            model=model,
-            args=training_args,
-            train_dataset=train_ds,
-            eval_dataset=eval_ds,
-            tokenizer=tokenizer,
-            compute_metrics=compute_metrics,
-        )
+        trainer = build_trainer(args, model, tokenizer, out_dir, train_ds, eval_ds)
 
         trainer.train()
-        trainer.save_model(str(out_dir / "best"))
+        trainer.save_final(lambda: trainer.save_model(str(out_dir / "best")), out_dir / "best")
+        trainer.report_io()
         print(f"Saved best model for {field} -> {out_dir/'best'}")
 
 
@@ -1,5 +1,5 @@
 """Shared utilities."""
 
-from src.utils.text import split_sentences
+from src.utils.text import split_sentence_spans, split_sentences
 
-__all__ = ["split_sentences"]
+__all__ = ["split_sentences", "split_sentence_spans"]
@@ -1,5 +1,5 @@
 import re
-from typing import List
+from typing import List, Tuple
 
 
 SENTENCE_SPLIT_REGEX = re.compile(r"(?<=[.!?])\s+")
@@ -11,3 +11,29 @@ def split_sentences(text: str) -> List[str]:
         return []
     sentences = SENTENCE_SPLIT_REGEX.split(text)
     return [s.strip() for s in sentences if s.strip()]
+
+
+def split_sentence_spans(text: str) -> List[Tuple[int, int]]:
+    """Same segmentation as split_sentences, as (start, end) char offsets into text.
+
+    text[start:end] is exactly the corresponding split_sentences entry.
+    """
+    start = len(text) - len(text.lstrip())
+    end = len(text.rstrip())
+    spans: List[Tuple[int, int]] = []
+
+    def add(a: int, b: int) -> None:
+        piece = text[a:b]
+        a += len(piece) - len(piece.lstrip())
+        b -= len(piece) - len(piece.rstrip())
+        if a < b:
+            spans.append((a, b))
+
+    if start >= end:
+        return spans
+    pos = start
+    for m in SENTENCE_SPLIT_REGEX.finditer(text, start, end):
+        add(pos, m.start())
+        pos = m.end()
+    add(pos, end)
+    return spans